@@ -0,0 +1,314 @@
+"""
+Benchmarks for trader/algorithm.py on reproducible synthetic inventories.
+
+    python -m benchmarks.algorithm [--scenario NAME] [--seed N] [--config config.json]
+
+Every scenario is run in upgrade and downgrade mode with the item ranges generate_trade would
+use. The reference path is the original algorithm: baseline_candidates(), a copy of the first
+release's generate_possible_trades, with every candidate scored by evaluate_trade. The current
+generate_possible_trades and every find_best_trade search mode are checked against the trades it
+ranks best, on both profit score and the items picked.
+
+The one intended difference is repeated copies: the original keeps a single trade per set of item
+names, so [A, B] hides [A, A, B]. Scenarios with copies are also enumerated the original way with
+only that fixed, "baseline enumeration[copies]", and held to that instead.
+"""
+import argparse
+import asyncio
+import copy
+import itertools
+import json
+import random
+import time
+import tracemalloc
+
+from trader import algorithm
+
+# Reference scoring walks every candidate through evaluate_trade, only done up to this many.
+REFERENCE_LIMIT = 200_000
+
+
+def make_catalog(rnd, size, value_only=False):
+    catalog = {}
+    for item_id in range(size):
+        rap = rnd.choice([rnd.randint(50, 2_000), rnd.randint(2_000, 60_000), rnd.randint(60_000, 400_000)])
+        if value_only:
+            value = rnd.choice([-1, 1, rap, rap + rnd.randint(-rap // 4, rap // 2)])
+        else:
+            value = rnd.choice([-1, -1, rap + rnd.randint(-rap // 3, rap // 2), rnd.randint(100, 50_000)])
+        original_price = rnd.choice([value, rnd.randint(10, 1_000)])
+        catalog[str(1_000_000 + item_id)] = [
+            f"Synthetic Item {item_id}", f"SI{item_id}", rap, value, original_price,
+            rnd.choice([-1, 0, 1, 2, 3, 4]), rnd.randint(0, 4),
+            rnd.choice([-1, -1, 0, 1]), rnd.choice([-1, 1]), rnd.choice([-1, -1, 1]),
+        ]
+    return catalog
+
+
+def item_value(item):
+    return item[algorithm.ITEM_VALUE] if item[algorithm.ITEM_VALUE] != -1 else item[algorithm.ITEM_RAP]
+
+
+def baseline_candidates(
+    giver_items, receiver_items, giver_min, giver_max, receiver_min, receiver_max,
+    mode, max_pairs, min_trade_send_value_total, copies=False
+):
+    """
+    The first release's generate_possible_trades, kept as is so the enumerator has something to be
+    held to. With `copies` trades are told apart by their item names counting repeats, not by name sets.
+    """
+    giver_items_sorted = sorted(giver_items, key=item_value, reverse=True)
+    receiver_items_sorted = sorted(receiver_items, key=item_value, reverse=True)
+    trades = []
+    seen = set()
+
+    giver_range = range(giver_min, min(giver_max, len(giver_items)) + 1)
+    receiver_range = range(receiver_min, min(receiver_max, len(receiver_items)) + 1)
+
+    if mode == "downgrade":
+        giver_range = sorted(giver_range)
+        receiver_range = sorted(receiver_range, reverse=True)
+    elif mode == "upgrade":
+        giver_range = sorted(giver_range, reverse=True)
+        receiver_range = sorted(receiver_range)
+
+    for i in giver_range:
+        for giver_combo in itertools.combinations(giver_items_sorted, i):
+            giver_ids = frozenset(item[algorithm.ITEM_NAME] for item in giver_combo)
+            giver_key = tuple(sorted(item[algorithm.ITEM_NAME] for item in giver_combo)) if copies else giver_ids
+            giver_values = set(item_value(item) for item in giver_combo)
+            for j in receiver_range:
+                if mode == "downgrade" and j <= i:
+                    continue
+                if mode == "upgrade" and i <= j:
+                    continue
+
+                for rc in itertools.combinations(receiver_items_sorted, j):
+                    if sum(item_value(item) for item in giver_combo) < min_trade_send_value_total:
+                        continue
+                    receiver_ids = frozenset(item[algorithm.ITEM_NAME] for item in rc)
+                    receiver_values = set(item_value(item) for item in rc)
+
+                    if giver_ids & receiver_ids:
+                        continue
+                    if giver_values & receiver_values:
+                        continue
+
+                    trade_key = (giver_key, tuple(sorted(item[algorithm.ITEM_NAME] for item in rc))) if copies else (giver_ids, receiver_ids)
+                    if trade_key in seen:
+                        continue
+
+                    seen.add(trade_key)
+                    trades.append({'giving_items': list(giver_combo), 'receiving_items': list(rc)})
+                    if max_pairs and len(trades) >= max_pairs:
+                        return trades
+    return trades
+
+
+def pick(rnd, rows, count, copies=0):
+    picked = rnd.sample(rows, count)
+    for _ in range(copies):
+        picked.append(rnd.choice(picked))
+    return picked
+
+
+def scenarios(seed):
+    def small(rnd):
+        rows = list(make_catalog(rnd, 150).values())
+        return pick(rnd, rows, 6), pick(rnd, rows, 8), False
+
+    def hoarder(rnd):
+        rows = list(make_catalog(rnd, 150).values())
+        hoard = pick(rnd, rows, 3)
+        return pick(rnd, rows, 8), [rnd.choice(hoard) for _ in range(45)] + pick(rnd, rows, 4), False
+
+    def duplicates(rnd):
+        rows = list(make_catalog(rnd, 150).values())
+        return pick(rnd, rows, 6, copies=6), pick(rnd, rows, 10, copies=14), False
+
+    def large(rnd):
+        rows = list(make_catalog(rnd, 600).values())
+        return pick(rnd, rows, 12), pick(rnd, rows, 220), False
+
+    def value_only(rnd):
+        rows = list(make_catalog(rnd, 200, value_only=True).values())
+        return pick(rnd, rows, 8), pick(rnd, rows, 14), True
+
+    return {
+        name: build(random.Random(f"{seed}:{name}"))
+        for name, build in [("small", small), ("hoarder", hoarder), ("duplicates", duplicates), ("large", large), ("value_only", value_only)]
+    }
+
+
+def load_settings(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)["accounts"][0]["trade"]["algorithm"]
+    except (OSError, KeyError, IndexError, ValueError) as e:
+        raise SystemExit(f"Could not read algorithm settings from {path}: {e}")
+
+
+def item_ranges(settings, mode):
+    # Same item counts generate_trade hands to find_best_trade.
+    if mode == "upgrade":
+        return settings["upgrade"]["min_items"], settings["upgrade"]["max_items"], settings["downgrade"]["min_items"], settings["downgrade"]["max_items"]
+    return settings["downgrade"]["min_items"], settings["downgrade"]["max_items"], settings["upgrade"]["min_items"], settings["upgrade"]["max_items"]
+
+
+async def measure(fn):
+    """(result, seconds, peak MiB). Time and memory come from separate runs, tracemalloc slows things down."""
+    started = time.perf_counter()
+    result = await fn()
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    await fn()
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def profit(trade):
+    if not trade:
+        return None
+    return round(trade["receiving_score"] - trade["giving_score"], 2)
+
+
+def trade_items(trade):
+    """The items on each side by name, copies included, whatever order they were picked in."""
+    return (
+        tuple(sorted(item[algorithm.ITEM_NAME] for item in trade["giving_items"])),
+        tuple(sorted(item[algorithm.ITEM_NAME] for item in trade["receiving_items"])),
+    )
+
+
+async def reference_best(candidates, settings):
+    """(best profit score, item sets of every candidate reaching it), or (None, set()) when none is accepted."""
+    best, picks = None, set()
+    for candidate in candidates:
+        decision, giving_score, receiving_score = await algorithm.evaluate_trade(
+            candidate["giving_items"], candidate["receiving_items"], settings, allow_edge=True
+        )
+        if not decision:
+            continue
+        score = round(receiving_score - giving_score, 2)
+        if best is None or score > best:
+            best, picks = score, {trade_items(candidate)}
+        elif score == best:
+            picks.add(trade_items(candidate))
+    return best, picks
+
+
+def agreement(score, items, reference):
+    """Whether a search's best trade is one the reference ranks best, same score and same items."""
+    best, picks = reference
+    if score != best:
+        return f"MISMATCH score {score}, expected {best}"
+    if items is not None and items not in picks:
+        return "MISMATCH items"
+    return "ok"
+
+
+def search_variants(settings):
+    performance = settings.get("performance", {})
+    variants = {}
+    for name, overrides in [
+        ("exhaustive", {"search_mode": "exhaustive"}),
+        ("pair_stream", {"search_mode": "exhaustive", "window_index_limit": 0}),
+        ("branch_and_bound", {"search_mode": "branch_and_bound"}),
+    ]:
+        variant = copy.deepcopy(settings)
+        variant["performance"] = {**performance, **overrides, "backend": "inline"}
+        variant["performance"].pop("time_budget", None)
+        variants[name] = variant
+    return variants
+
+
+async def run(name, giver_items, receiver_items, settings, mode):
+    giver_min, giver_max, receiver_min, receiver_max = item_ranges(settings, mode)
+    performance = settings["performance"]
+    rows = []
+
+    def enumerate_baseline(copies):
+        return asyncio.to_thread(
+            baseline_candidates, giver_items, receiver_items, giver_min, giver_max, receiver_min, receiver_max,
+            mode, performance["max_pairs"], settings["thresholds"]["min_trade_send_value_total"], copies
+        )
+
+    baseline, elapsed, peak = await measure(lambda: enumerate_baseline(False))
+    rows.append(("baseline enumeration", len(baseline), elapsed, peak, "-"))
+
+    # The enumerators count max_pairs differently, truncated runs can't be held to each other.
+    truncated = len(baseline) >= performance["max_pairs"]
+    reference, checked = None, False
+    if len(baseline) <= REFERENCE_LIMIT and not truncated:
+        checked = True
+        reference, elapsed, peak = await measure(lambda: reference_best(baseline, settings))
+        rows.append(("evaluate_trade", len(baseline), elapsed, peak, reference[0]))
+    del baseline
+
+    names = [item[algorithm.ITEM_NAME] for item in giver_items], [item[algorithm.ITEM_NAME] for item in receiver_items]
+    if checked and any(len(set(side)) < len(side) for side in names):
+        baseline, elapsed, peak = await measure(lambda: enumerate_baseline(True))
+        truncated = len(baseline) >= performance["max_pairs"]
+        checked = len(baseline) <= REFERENCE_LIMIT and not truncated
+        if checked:
+            original, reference = reference, await reference_best(baseline, settings)
+            result = "same" if reference == original else f"{reference[0]}, original {original[0]}"
+        else:
+            result = "-"
+        rows.append(("baseline enumeration[copies]", len(baseline), elapsed, peak, result))
+        del baseline
+
+    candidates, elapsed, peak = await measure(lambda: algorithm.generate_possible_trades(
+        giver_items, receiver_items, giver_min, giver_max, receiver_min, receiver_max,
+        mode, performance["max_pairs"], settings["thresholds"]["min_trade_send_value_total"]
+    ))
+    result = "n/a"
+    if checked and len(candidates) < performance["max_pairs"]:
+        # Candidates the enumerator leaves out have to be ones the reference never ranks best.
+        best, picks = await reference_best(candidates, settings)
+        result = agreement(best, None, reference)
+        if result == "ok" and picks != reference[1]:
+            result = "MISMATCH items"
+    rows.append(("generate_possible_trades", len(candidates), elapsed, peak, result))
+    del candidates
+
+    for variant, variant_settings in search_variants(settings).items():
+        stats = {}
+        trade, elapsed, peak = await measure(lambda: algorithm.find_best_trade(
+            giver_items, receiver_items, variant_settings,
+            giver_min, giver_max, receiver_min, receiver_max,
+            True, performance["batch_size"], mode, performance["max_pairs"],
+            settings["thresholds"]["min_trade_send_value_total"], stats=stats
+        ))
+        if not checked:
+            result = "n/a"
+        else:
+            result = agreement(profit(trade), trade_items(trade["trade"]) if trade else None, reference)
+        rows.append((f"find_best_trade[{variant}]", stats.get("evaluated", 0), elapsed, peak, result))
+
+    print(f"\n{name} · {mode} · {len(giver_items)} ours / {len(receiver_items)} theirs{' · truncated at max_pairs' if truncated else ''}")
+    print(f"  {'step':<34}{'candidates':>12}{'seconds':>10}{'cand/s':>12}{'peak MiB':>10}  result")
+    for step, count, elapsed, peak, result in rows:
+        print(f"  {step:<34}{count:>12}{elapsed:>10.3f}{count / elapsed if elapsed else 0:>12.0f}{peak:>10.1f}  {result}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--scenario", action="append", help="only run these scenarios")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    settings = load_settings(args.config)
+    for name, (giver_items, receiver_items, value_only) in scenarios(args.seed).items():
+        if args.scenario and name not in args.scenario:
+            continue
+        scenario_settings = copy.deepcopy(settings)
+        scenario_settings["modes"]["value_only"] = value_only or settings["modes"]["value_only"]
+        for mode in ("upgrade", "downgrade"):
+            await run(name, giver_items, receiver_items, scenario_settings, mode)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+"""
+Benchmarks for JSVariableExtractor on the saved pages in benchmarks/fixtures.
+
+    python -m benchmarks.extractor [--repeat N] [--scale N]
+
+For every fixture the variable the bot reads from that page is taken out with extract(), which
+walks every declaration, and with extract_named(), which only decodes the one asked for. Both are
+timed and checked to give the same value. --scale repeats the catalog page's item_details that
+many times over, for pages closer to the real multi-megabyte catalog.
+"""
+import argparse
+import json
+import re
+import time
+from pathlib import Path
+
+from trader.helpers import JSVariableExtractor
+from trader.models import item
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+# Page and the variable the bot reads from it.
+PAGES = {
+    "catalog.html": item.BASE_GENERIC_ITEM_VAR_NAME,
+    "player.html": "player_details_data",
+}
+
+
+def scaled(html, name, scale):
+    """html with the object assigned to `name` holding `scale` copies of every entry."""
+    if scale <= 1:
+        return html
+    match = re.search(r"\bvar\s+" + re.escape(name) + r"\s*=\s*", html)
+    if match is None:
+        return html
+    value, end = json.JSONDecoder().raw_decode(html, match.end())
+    if not isinstance(value, dict):
+        return html
+    value = {f"{key}{copy}": entry for copy in range(scale) for key, entry in value.items()}
+    return html[:match.end()] + json.dumps(value, separators=(",", ":")) + html[end:]
+
+
+def measure(fn, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run(page, name, repeat, scale):
+    html = scaled((FIXTURES / page).read_text(encoding="utf-8"), name, scale)
+    full, everything = measure(lambda: JSVariableExtractor(html).extract(), repeat)
+    named, wanted = measure(lambda: JSVariableExtractor(html).extract_named(name), repeat)
+    same = name in everything and name in wanted and everything[name].value == wanted[name].value
+
+    print(f"\n{page} · {len(html) / 1024:.0f} KiB · {name}")
+    print(f"  {'method':<18}{'ms (best)':>12}{'speedup':>10}  result")
+    print(f"  {'extract':<18}{full * 1000:>12.2f}{1:>10.1f}  {len(everything)} variables")
+    print(f"  {'extract_named':<18}{named * 1000:>12.2f}{full / named if named else 0:>10.1f}  {'same value' if same else 'MISMATCH'}")
+    return same
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per method, the best one counts")
+    parser.add_argument("--scale", type=int, default=1, help="copies of the catalog's items")
+    args = parser.parse_args()
+
+    results = [run(page, name, args.repeat, args.scale if page == "catalog.html" else 1) for page, name in PAGES.items()]
+    if not all(results):
+        raise SystemExit("extract_named() disagrees with extract()")
+
+
+if __name__ == "__main__":
+    main()
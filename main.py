@@ -3,7 +3,9 @@ import json
 import asyncio
 import logging
 
+from trader import backends, ratelimit, rolimon, sessions
 from trader.auth.authenticator import AuthenticatorAsync
+from trader.watchdog import LoopWatchdog
 
 logging.basicConfig(
     level=logging.INFO,
@@ -21,6 +23,11 @@ async def main():
         logging.error(f"❌ Failed to load config.json: {e}")
         return
 
+    sessions.configure(config.get("http"))
+    limits = config.get("rate_limits", {})
+    ratelimit.configure(limits)
+    rolimon.configure_ad_counts(config.get("ad_count_cache"))
+
     try:
         auth_client = AuthenticatorAsync()
         logging.info("🔐 Authenticator initialized ✅")
@@ -37,13 +44,30 @@ async def main():
         except Exception as e:
             logging.error(f"❌ Failed to create Bot #{index:02d}: {e}")
 
+    # Every bot shares this event loop, so anything hogging it is reported with its stack.
+    watchdog = LoopWatchdog(config.get("watchdog", {}).get("max_lag", 1.0))
+    watchdog.start()
+    reporter = asyncio.create_task(ratelimit.limiter.report(limits["report_interval"])) if limits.get("report_interval") else None
+    ad_count_saver = asyncio.create_task(rolimon.persist_ad_counts(config.get("ad_count_cache", {}).get("save_interval", 60)))
+
     try:
         await asyncio.gather(*(bot.start() for bot in bots))
         logging.info("🚀 All bots are now running! ✅")
     except Exception as e:
         logging.error(f"🔥 Error during bot startup: {e}")
+    finally:
+        watchdog.stop()
+        if reporter is not None:
+            reporter.cancel()
+        ad_count_saver.cancel()
+        try:
+            await rolimon.save_ad_counts()
+        except Exception as e:
+            logging.error(f"❌ Failed to save cached ad counts: {e}")
+        await sessions.close()
+        backends.shutdown()
 
 
 
-
-asyncio.run(main())
\ No newline at end of file
+if __name__ == "__main__":
+    asyncio.run(main())
\ No newline at end of file
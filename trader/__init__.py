@@ -1,5 +1,4 @@
 import asyncio
-import aiohttp
 import random
 import time
 import json
@@ -8,7 +7,14 @@ import logging
 from datetime import datetime
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
+from . import algorithm
+from . import cache
+from . import combos
+from . import ratelimit
 from . import rolimon
+from . import rules
+from . import sessions
+from . import tradebook
 from . import user
 from . import trades
 from . import cookie
@@ -31,10 +37,13 @@ class bot:
         self.rolimons_working = True
         self.is_paused_on_hold = False
         self.sleep_time_trade_send = data["trade"]["sleep_time"]
+        self.trade_sends = ratelimit.TokenBucket(1 / self.sleep_time_trade_send if self.sleep_time_trade_send > 0 else 0)
 
         self.roli_verification = data["rolimon"]["roli_verification_token"]
         self.rolimon_ads_sleep_time = data["rolimon"]["ads"]["sleep_time"]
         self.max_trade_ads = data["rolimon"].get("max_trade_ads", 10)
+        self.tracker_prefetch = data["rolimon"].get("tracker", {}).get("prefetch", 8)
+        self.tracker_screeners = data["rolimon"].get("tracker", {}).get("screeners", 2)
         self.rolimon_ads = data["rolimon"]["ads"]["offers"]
         self.limiteds_value_updater_sleep_time = data["rolimon"]["limiteds_value_updater_sleep_time"]
         self.manual_rolimon_limiteds = data["rolimon"]["manual_rolimon_items"]
@@ -42,17 +51,27 @@ class bot:
         self.item_ids_not_accepting = data["trade"]["items"]["not_accepting"]
 
         self.algorithm = data["trade"]["algorithm"]
+        self.giver_index = combos.CombinationIndex(max(self.algorithm["upgrade"]["max_items"], self.algorithm["downgrade"]["max_items"]))
+        self.search_cache = cache.LRUCache(self.algorithm["performance"].get("search_cache_size", 512))
+        self.inventories = user.InventoryCache(
+            self.algorithm["performance"].get("inventory_ttl", user.INVENTORY_TTL),
+            self.algorithm["performance"].get("private_inventory_ttl", user.PRIVATE_INVENTORY_TTL)
+        )
 
         self.webhook = data["webhook"]
 
         self.limiteds = {}
         self.all_limiteds = {}
+        self.catalog_version = None
+        self._eligibility = None
 
         self.user_id = None
         self.xcsrf_token = None
         self.last_generated_time = 0
 
         self.all_processed_trades = []
+        self.outbound_trades = tradebook.TradeBook()
+        self.inbound_trades = tradebook.TradeBook()
 
         self.item_price = {}
         self.trade_timestamps = []
@@ -64,7 +83,7 @@ class bot:
 
     async def scrape_user_id(self):
         try:
-            async with aiohttp.ClientSession() as session:
+            async with sessions.shared() as session:
                 async with session.get("https://users.roblox.com/v1/users/authenticated", cookies={".ROBLOSECURITY": self.cookie}) as response:
                     if response.status == 200:
                         self.user_id = (await response.json())["id"]
@@ -76,7 +95,7 @@ class bot:
 
     async def generate_xcsrf_token(self):
         try:
-            async with aiohttp.ClientSession() as session:
+            async with sessions.shared() as session:
                 async with session.post("https://auth.roblox.com/v2/logout", cookies={".ROBLOSECURITY": self.cookie}) as resp:
                     self.xcsrf_token = resp.headers.get("x-csrf-token")
             self.last_generated_time = time.time()
@@ -158,7 +177,23 @@ class bot:
                         limiteds_value[item_id][3] = int(value)
         if limiteds_value != self.all_limiteds:
             logging.info("✅ Limiteds updated.")
-        self.all_limiteds = limiteds_value
+            self.all_limiteds = limiteds_value
+            self.catalog_version = algorithm.catalog_version(limiteds_value)
+            self.eligibility()
+
+    def score_table(self):
+        return algorithm.score_table(self.all_limiteds, self.algorithm, self.catalog_version)
+
+    def eligibility(self):
+        """rules.Eligibility of the current catalog, compiled once per catalog version."""
+        if self._eligibility is None or self._eligibility.version != self.catalog_version:
+            self._eligibility = rules.Eligibility(
+                self.all_limiteds, self.algorithm,
+                self.item_ids_not_for_trade, self.item_ids_not_accepting,
+                self.catalog_version
+            )
+            self.score_table().add(self._eligibility.adjusted_rows())
+        return self._eligibility
 
     async def update_limiteds_task(self):
         while True:
@@ -171,8 +206,8 @@ class bot:
 
     async def send_webhook_notification(self, message):
         try:
-            async with aiohttp.ClientSession() as session:
-                await session.post(self.webhook, json=message)
+            async with sessions.get().post(self.webhook, json=message):
+                pass
             logging.info(f"✅ Webhook notification sent")
         except Exception as e:
             logging.error(f"❌ Failed to send webhook: {e}")
@@ -1,9 +1,17 @@
 import asyncio
+import hashlib
+import json
 import math
+import time
+import heapq
 import itertools
-from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from collections import Counter
 
-executor = ThreadPoolExecutor(max_workers=50)
+from . import engine
+from . import backends
+from . import combos
+from .watchdog import TIME_SLICE, TimeSlice
 
 ITEM_NAME = 0
 ITEM_ACRONYM = 1
@@ -18,7 +26,7 @@ ITEM_RARE = 9
 
 IHAVENOFUCKINGIDEA = 10
 
-async def adjust_value(value, rap):
+def _adjust_value(value, rap):
     if rap <= value:
         return value
     p = rap / value
@@ -26,14 +34,17 @@ async def adjust_value(value, rap):
     raw_multiplier = 1 + scaling_factor * math.tanh(10 * (p - 0.90))
     return value * raw_multiplier
 
-async def item_score(item, settings):
+async def adjust_value(value, rap):
+    return _adjust_value(value, rap)
+
+def _item_score(item, settings):
     has_value = item[ITEM_VALUE] != -1
     if settings["modes"]["rap_only_base"]:
         base = item[ITEM_RAP] * settings["modifiers"]["lower_rap_only_item"]
     else:
         base = item[ITEM_VALUE] if has_value else item[ITEM_RAP] * settings["modifiers"]["lower_rap_only_item"]
         if has_value and item[ITEM_VALUE] != item[ITEM_ORIGINAL_PRICE]:
-            base = await adjust_value(item[ITEM_VALUE], item[ITEM_RAP])
+            base = _adjust_value(item[ITEM_VALUE], item[ITEM_RAP])
 
     demand = max(item[ITEM_DEMAND], 0)
 
@@ -49,9 +60,92 @@ async def item_score(item, settings):
     )
     return base + bonus
 
-async def total_score(items, settings):
+async def item_score(item, settings):
+    return _item_score(item, settings)
+
+async def total_score(items, settings, score_table=None):
+    if score_table is not None:
+        return sum([score_table.score(item) for item in items])
     return sum([await item_score(item, settings) for item in items])
 
+def catalog_version(catalog):
+    """Content fingerprint of a catalog dict, changes whenever any row does."""
+    return hashlib.sha1(json.dumps(catalog, sort_keys=True).encode()).hexdigest()
+
+def scoring_key(settings):
+    """Fingerprint of the settings item_score depends on."""
+    scoring = {"modes": settings["modes"], "modifiers": settings["modifiers"]}
+    return hashlib.sha1(json.dumps(scoring, sort_keys=True).encode()).hexdigest()
+
+def settings_key(settings):
+    """Fingerprint of every algorithm setting, anything a search result can depend on."""
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+def items_fingerprint(items):
+    """Fingerprint of a multiset of catalog rows, whatever order they come in."""
+    return hashlib.sha1(json.dumps(sorted(json.dumps(item) for item in items)).encode()).hexdigest()
+
+class ScoreTable:
+    """
+    item_score of every catalog row, computed once per catalog version and scoring settings.
+    Rows are looked up by identity, so copies made after the fact are scored on the fly instead,
+    unless they were add()ed or belong to a catalog of the same version that was attach()ed.
+    """
+    def __init__(self, catalog, settings, version=None):
+        self.settings = settings
+        self.key = (version or catalog_version(catalog), scoring_key(settings))
+        self.catalog = catalog
+        self._scores = {id(row): _item_score(row, settings) for row in catalog.values()}
+        self._added = []
+        self._catalogs = {id(catalog): catalog}
+
+    def add(self, rows):
+        """Scores extra rows derived from the catalog, like rules.Eligibility's adjusted rows, up front."""
+        for row in rows:
+            if id(row) not in self._scores:
+                # Holding on to the row keeps its id from being reused by another object.
+                self._added.append(row)
+                self._scores[id(row)] = _item_score(row, self.settings)
+
+    def attach(self, catalog):
+        """
+        Takes in the rows of another catalog dict of the same version, like another account's copy,
+        reusing the scores of the rows they match by item id instead of scoring them again.
+        """
+        if id(catalog) in self._catalogs:
+            return
+        self._catalogs[id(catalog)] = catalog
+        for item_id, row in catalog.items():
+            own = self.catalog.get(item_id)
+            score = self._scores.get(id(own)) if own is not None else None
+            self._scores[id(row)] = score if score is not None else _item_score(row, self.settings)
+
+    def score(self, item):
+        score = self._scores.get(id(item))
+        return score if score is not None else _item_score(item, self.settings)
+
+    def __len__(self):
+        return len(self._scores)
+
+_score_tables = {}
+_MAX_SCORE_TABLES = 4
+
+def score_table(catalog, settings, version=None):
+    """
+    Shared ScoreTable for a catalog version, rebuilt only when the version or the scoring settings
+    change. Every catalog dict of that version, one per account, is attached to the same table.
+    """
+    key = (version or catalog_version(catalog), scoring_key(settings))
+    table = _score_tables.get(key)
+    if table is None:
+        table = ScoreTable(catalog, settings, key[0])
+        _score_tables[key] = table
+        while len(_score_tables) > _MAX_SCORE_TABLES:
+            _score_tables.pop(next(iter(_score_tables)))
+    else:
+        table.attach(catalog)
+    return table
+
 async def apply_bulk_penalty(score, item_count, settings):
     if item_count > 1:
         penalty = settings["penalties"]["bulk_penalty_rate"] * (item_count - 1)
@@ -74,12 +168,12 @@ async def is_valid_upgrade(given_items, max_item_ratio, min_item_ratio):
         for item in given_items
     )
 
-async def evaluate_trade(giving_items, receiving_items, settings, allow_edge=False):
+async def evaluate_trade(giving_items, receiving_items, settings, allow_edge=False, score_table=None):
     if settings["modes"]["value_only"] and any(item[ITEM_VALUE] <= 0 for item in receiving_items):
         return 0, 0, 0
 
-    giving_score = await total_score(giving_items, settings)
-    receiving_score = await total_score(receiving_items, settings)
+    giving_score = await total_score(giving_items, settings, score_table)
+    receiving_score = await total_score(receiving_items, settings, score_table)
     giving_score = await apply_bulk_penalty(giving_score, len(giving_items), settings)
     receiving_score = await apply_bulk_penalty(receiving_score, len(receiving_items), settings)
     giving_score = await apply_upgrade_penalty(giving_score, giving_items, receiving_items, settings)
@@ -123,6 +217,108 @@ async def evaluate_trade(giving_items, receiving_items, settings, allow_edge=Fal
 
     return decision, round(giving_score, 2), round(receiving_score, 2)
 
+def raw_value(item):
+    return item[ITEM_VALUE] if item[ITEM_VALUE] != -1 else item[ITEM_RAP]
+
+def search_ranges(giver_count, receiver_count, giver_min, giver_max, receiver_min, receiver_max, mode=None):
+    giver_range = range(giver_min, min(giver_max, giver_count) + 1)
+    receiver_range = range(receiver_min, min(receiver_max, receiver_count) + 1)
+
+    if mode == "downgrade":
+        return sorted(giver_range), sorted(receiver_range, reverse=True)
+    elif mode == "upgrade":
+        return sorted(giver_range, reverse=True), sorted(receiver_range)
+    return list(giver_range), list(receiver_range)
+
+def sizes_allowed(mode, giver_size, receiver_size):
+    if mode == "downgrade" and receiver_size <= giver_size:
+        return False
+    if mode == "upgrade" and giver_size <= receiver_size:
+        return False
+    return True
+
+def sort_items(items):
+    """Items sorted by value, high to low, with copies of the same catalog row kept next to each other."""
+    first_seen = {}
+    for item in items:
+        first_seen.setdefault(tuple(item), len(first_seen))
+    return sorted(items, key=lambda item: (-raw_value(item), first_seen[tuple(item)]))
+
+def copy_groups(items_sorted):
+    """groups[p] is the first position holding the same catalog row as position p."""
+    groups = []
+    for position, item in enumerate(items_sorted):
+        if position and tuple(item) == tuple(items_sorted[position - 1]):
+            groups.append(groups[-1])
+        else:
+            groups.append(position)
+    return groups
+
+def unique_combinations(groups, size, start=0):
+    """
+    Position tuples of `size` picks out of a sort_items list, yielding every distinct multiset of
+    items once (in lexicographic order) instead of once per way of choosing between copies.
+    """
+    if size == 0:
+        yield ()
+        return
+    for p in range(start, len(groups) - size + 1):
+        if p > start and groups[p] == groups[p - 1]:
+            continue
+        for rest in unique_combinations(groups, size - 1, p + 1):
+            yield (p,) + rest
+
+def giver_combinations(groups, size, giver_combos=None):
+    if giver_combos is None:
+        return unique_combinations(groups, size)
+    return map(tuple, giver_combos[size].tolist())
+
+def iter_trade_indices(
+    giver_items_sorted, receiver_items_sorted,
+    giver_min=1, giver_max=4,
+    receiver_min=1, receiver_max=4,
+    mode=None, max_pairs=None,
+    min_trade_send_value_total=0,
+    giver_combos=None
+):
+    """
+    Lazily yields (giver positions, receiver positions) tuples into two sort_items lists, in
+    generate_possible_trades order and with its filters. Copies are enumerated as multisets,
+    so every distinct pair of item multisets comes out exactly once.
+    `giver_combos` optionally maps a giver size to precomputed giver position tuples.
+    """
+    giver_names = [item[ITEM_NAME] for item in giver_items_sorted]
+    receiver_names = [item[ITEM_NAME] for item in receiver_items_sorted]
+    giver_raw = [raw_value(item) for item in giver_items_sorted]
+    receiver_raw = [raw_value(item) for item in receiver_items_sorted]
+    giver_groups = copy_groups(giver_items_sorted)
+    receiver_groups = copy_groups(receiver_items_sorted)
+
+    giver_range, receiver_range = search_ranges(
+        len(giver_items_sorted), len(receiver_items_sorted),
+        giver_min, giver_max, receiver_min, receiver_max, mode
+    )
+
+    emitted = 0
+    for i in giver_range:
+        for giver_idx in giver_combinations(giver_groups, i, giver_combos):
+            if sum(giver_raw[k] for k in giver_idx) < min_trade_send_value_total:
+                continue
+            giver_ids = {giver_names[k] for k in giver_idx}
+            giver_values = {giver_raw[k] for k in giver_idx}
+            for j in receiver_range:
+                if not sizes_allowed(mode, i, j):
+                    continue
+
+                for receiver_idx in unique_combinations(receiver_groups, j):
+                    if any(receiver_names[k] in giver_ids or receiver_raw[k] in giver_values for k in receiver_idx):
+                        continue
+
+                    yield giver_idx, receiver_idx
+                    emitted += 1
+                    if max_pairs and emitted >= max_pairs:
+                        return
+
 async def generate_possible_trades(
     giver_items, receiver_items,
     giver_min=1, giver_max=4,
@@ -131,128 +327,842 @@ async def generate_possible_trades(
     min_trade_send_value_total=0
 ):
     try:
-        giver_items_sorted = sorted(giver_items, key=lambda x: x[ITEM_VALUE] if x[ITEM_VALUE] != -1 else x[ITEM_RAP], reverse=True)
-        receiver_items_sorted = sorted(receiver_items, key=lambda x: x[ITEM_VALUE] if x[ITEM_VALUE] != -1 else x[ITEM_RAP], reverse=True)
-        trades = []
-        seen = set()
-
-        giver_range = range(giver_min, min(giver_max, len(giver_items)) + 1)
-        receiver_range = range(receiver_min, min(receiver_max, len(receiver_items)) + 1)
-
-        if mode == "downgrade":
-            giver_range = sorted(giver_range)
-            receiver_range = sorted(receiver_range, reverse=True)
-        elif mode == "upgrade":
-            giver_range = sorted(giver_range, reverse=True)
-            receiver_range = sorted(receiver_range)
-
-        for i in giver_range:
-            for giver_combo in itertools.combinations(giver_items_sorted, i):
-                giver_ids = frozenset(item[ITEM_NAME] for item in giver_combo)
-                giver_values = set((item[ITEM_VALUE] if item[ITEM_VALUE] != -1 else item[ITEM_RAP]) for item in giver_combo)
-                for j in receiver_range:
-                    if mode == "downgrade" and j <= i:
-                        continue
-                    if mode == "upgrade" and i <= j:
-                        continue
+        # Filtered-out combinations can keep the enumeration busy for seconds, so it runs in a
+        # worker thread instead of holding up the event loop.
+        return await asyncio.to_thread(
+            _possible_trades, giver_items, receiver_items,
+            giver_min, giver_max, receiver_min, receiver_max,
+            mode, max_pairs, min_trade_send_value_total
+        )
+    except:
+        return []
 
-                    for rc in itertools.combinations(receiver_items_sorted, j):
-                        total_giving_value = sum(item[ITEM_VALUE] if item[ITEM_VALUE] != -1 else item[ITEM_RAP] for item in giver_combo)
-                        if total_giving_value < min_trade_send_value_total:
-                            continue
-                        receiver_ids = frozenset(item[ITEM_NAME] for item in rc)
-                        receiver_values = set((item[ITEM_VALUE] if item[ITEM_VALUE] != -1 else item[ITEM_RAP]) for item in rc)
+def _possible_trades(
+    giver_items, receiver_items,
+    giver_min, giver_max, receiver_min, receiver_max,
+    mode, max_pairs, min_trade_send_value_total
+):
+    giver_items_sorted = sort_items(giver_items)
+    receiver_items_sorted = sort_items(receiver_items)
+    return [
+        {
+            'giving_items': [giver_items_sorted[k] for k in giver_idx],
+            'receiving_items': [receiver_items_sorted[k] for k in receiver_idx]
+        }
+        for giver_idx, receiver_idx in iter_trade_indices(
+            giver_items_sorted, receiver_items_sorted,
+            giver_min, giver_max, receiver_min, receiver_max,
+            mode, max_pairs, min_trade_send_value_total
+        )
+    ]
 
-                        if giver_ids & receiver_ids:
-                            continue
+class CandidateHeap:
+    """
+    Keeps the `size` best candidates seen so far. Keys are (profit score, raw profit, -sequence),
+    which ranks candidates exactly like find_best_trade's sort-then-first-best walk.
+    """
+    def __init__(self, size=1):
+        self.size = max(1, size)
+        self._heap = []
 
-                        if giver_values & receiver_values:
-                            continue
+    def __len__(self):
+        return len(self._heap)
 
-                        trade_key = (giver_ids, receiver_ids)
-                        if trade_key in seen:
-                            continue
+    def push(self, key, payload):
+        if len(self._heap) < self.size:
+            heapq.heappush(self._heap, (key, payload))
+        elif key > self._heap[0][0]:
+            heapq.heapreplace(self._heap, (key, payload))
 
-                        seen.add(trade_key)
-                        trades.append({
-                            'giving_items': list(giver_combo),
-                            'receiving_items': list(rc)
-                        })
+    def ranked(self):
+        return [payload for _, payload in sorted(self._heap, key=lambda entry: entry[0], reverse=True)]
 
-                        if max_pairs and len(trades) >= max_pairs:
-                            return trades
-    except:
-        return []
-    return trades
+    def best(self):
+        return max(self._heap, key=lambda entry: entry[0])[1] if self._heap else None
 
+    def threshold(self):
+        """Profit score a new candidate has to reach to still make it into the heap."""
+        return self._heap[0][0][0] if len(self._heap) >= self.size else 0
 
-async def batch_evaluate_trade(trade, settings, allow_edge=False):
-    giving_items = trade['giving_items']
-    receiving_items = trade['receiving_items']
-    decision, giving_score, receiving_score = await evaluate_trade(giving_items, receiving_items, settings, allow_edge)
+def push_results(heap, result, candidates, sequence):
+    """Ranks one evaluated batch into `heap`; `candidates[i]` is the payload of row `i`."""
+    for index, giving_score, receiving_score in engine.top_candidates(result, heap.size):
+        raw_profit = int(result.receiving_raw[index] - result.giving_raw[index])
+        heap.push(
+            (receiving_score - giving_score, raw_profit, -(sequence + index)),
+            (candidates[index], giving_score, receiving_score)
+        )
+
+def trade_info(entry, givers, receivers, offset):
+    if entry is None:
+        return None
+    (giver_idx, receiver_idx), giving_score, receiving_score = entry
     return {
-        'trade': trade,
-        'decision': decision,
+        'trade': {
+            'giving_items': [givers[k] for k in giver_idx],
+            'receiving_items': [receivers[k - offset] for k in receiver_idx]
+        },
         'giving_score': giving_score,
         'receiving_score': receiving_score
     }
 
-def sync_batch_eval(trades, settings, allow_edge):
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    async def run_batch():
-        tasks = [batch_evaluate_trade(trade, settings, allow_edge) for trade in trades]
-        return await asyncio.gather(*tasks)
-    results = loop.run_until_complete(run_batch())
-    loop.close()
-    return results
+# Candidates kept per alternative asked for, so enough trades without shared items survive the heap.
+ALTERNATIVE_POOL = 64
 
-async def find_best_trade(
+def pool_size(settings, alternatives=1):
+    """Heap size a search needs to hand back `alternatives` trades."""
+    heap_size = settings.get("performance", {}).get("heap_size", 1)
+    return max(heap_size, alternatives * ALTERNATIVE_POOL) if alternatives > 1 else heap_size
+
+def best_trades(heap, givers, receivers, offset, alternatives=1):
+    """
+    trade_info of the best candidate in `heap`. When more than one alternative is asked for it
+    also holds 'alternatives': the next best candidates, by profit score, that share no item with
+    it or with each other, so any of them can still be sent once another has gone out or failed.
+    """
+    picked, used = [], set()
+    for entry in heap.ranked():
+        if len(picked) >= alternatives:
+            break
+        (giver_idx, receiver_idx), _, _ = entry
+        names = {givers[k][ITEM_NAME] for k in giver_idx} | {receivers[k - offset][ITEM_NAME] for k in receiver_idx}
+        if names & used:
+            continue
+        picked.append(entry)
+        used |= names
+    if not picked:
+        return None
+    best = trade_info(picked[0], givers, receivers, offset)
+    if alternatives > 1:
+        best['alternatives'] = [trade_info(entry, givers, receivers, offset) for entry in picked[1:]]
+    return best
+
+def build_item_table(items, settings, score_table=None):
+    matrix = np.array([
+        (item[ITEM_VALUE], item[ITEM_RAP], item[ITEM_DEMAND], item[ITEM_RARE], item[ITEM_PROJECTED], item[ITEM_ORIGINAL_PRICE])
+        for item in items
+    ], dtype=np.int64)
+    return engine.ItemTable.from_columns(matrix, item_scores(items, settings, score_table))
+
+def item_scores(items, settings, score_table=None):
+    if score_table is not None:
+        return [score_table.score(item) for item in items]
+    return [_item_score(item, settings) for item in items]
+
+def build_thresholds(settings):
+    return engine.Thresholds(
+        value_only=bool(settings["modes"]["value_only"]),
+        bulk_penalty_rate=settings["penalties"]["bulk_penalty_rate"],
+        upgrade_penalty_multiplier=settings["penalties"]["upgrade_penalty_multiplier"],
+        max_giving_value_when_upgrading=settings["thresholds"]["max_giving_value_when_upgrading"],
+        min_receiving_value_when_downgrading=settings["thresholds"]["min_receiving_value_when_downgrading"],
+        max_edge_value=settings["thresholds"]["max_edge_value"],
+        max_item_ratio_upgrade=settings["item_ratio_constraints"]["max_item_ratio_upgrade"],
+        min_item_ratio_upgrade=settings["item_ratio_constraints"]["min_item_ratio_upgrade"],
+    )
+
+def receiving_window(giving_raw, thresholds, allow_edge=False):
+    """
+    Loose (lo, hi) bounds on the receiving raw total that evaluate_trade could accept for a
+    given giving raw total, or an array of them. Only used to skip candidates, the exact checks
+    still run on the rest.
+    """
+    upgrade_lo = giving_raw / thresholds.max_giving_value_when_upgrading
+    downgrade_lo = giving_raw * max(thresholds.min_receiving_value_when_downgrading, 1)
+    lo = np.maximum(giving_raw / thresholds.max_edge_value, np.minimum(upgrade_lo, downgrade_lo))
+    hi = giving_raw * thresholds.max_edge_value if allow_edge else np.full_like(lo, math.inf)
+    return lo * (1 - 1e-9), hi * (1 + 1e-9)
+
+# Rounding giving and receiving scores to 2 decimals moves a profit score by at most 0.01.
+ROUNDING_SLACK = 0.011
+
+def _branch_and_bound(
+    givers, receivers, table, thresholds,
+    giver_min, giver_max, receiver_min, receiver_max,
+    allow_edge, batch_size, mode, min_trade_send_value_total,
+    giver_combos=None, deadline=None, heap_size=1, alternatives=1
+):
+    started = time.time()
+    stats = {"evaluated": 0, "coverage": None, "complete": True, "elapsed": 0.0}
+    giver_range, receiver_range = search_ranges(
+        len(givers), len(receivers),
+        giver_min, giver_max, receiver_min, receiver_max, mode
+    )
+    if not givers or not receivers or not giver_range or not receiver_range:
+        return None, stats
+
+    offset = len(givers)
+    raw = table.raw.tolist()
+    score = table.score.tolist()
+    receiver_raw = raw[offset:offset + len(receivers)]
+    receiver_score = score[offset:offset + len(receivers)]
+    n = len(receivers)
+    depth = max(receiver_range)
+    giver_groups = copy_groups(givers)
+    receiver_groups = copy_groups(receivers)
+
+    # cumulative raw values (sorted high to low) bound what `m` more picks can add,
+    # suffix_top[p] holds the best scores still available from position p on.
+    cumulative = [0]
+    for value in receiver_raw:
+        cumulative.append(cumulative[-1] + value)
+    suffix_top = [[] for _ in range(n + 1)]
+    for p in range(n - 1, -1, -1):
+        suffix_top[p] = sorted([receiver_score[p]] + suffix_top[p + 1], reverse=True)[:depth]
+
+    def bulk(count):
+        return 1 - thresholds.bulk_penalty_rate * (count - 1) if count > 1 else 1.0
+
+    heap = CandidateHeap(heap_size)
+    pending = []
+    evaluated = 0
+
+    def flush():
+        nonlocal evaluated
+        if not pending:
+            return
+        giving = table.pack([giver_idx for giver_idx, _ in pending], giver_max)
+        receiving = table.pack([receiver_idx for _, receiver_idx in pending], receiver_max)
+        result = engine.evaluate(table, giving, receiving, thresholds, allow_edge)
+        push_results(heap, result, pending, evaluated)
+        evaluated += len(pending)
+        pending.clear()
+
+    for i in giver_range:
+        if not stats["complete"]:
+            break
+        for giver_idx in giver_combinations(giver_groups, i, giver_combos):
+            if deadline and time.time() >= deadline:
+                stats["complete"] = False
+                break
+            giving_raw = sum(raw[k] for k in giver_idx)
+            if giving_raw < min_trade_send_value_total:
+                continue
+            giver_names = {givers[k][ITEM_NAME] for k in giver_idx}
+            giver_values = {raw[k] for k in giver_idx}
+            eligible = [
+                receivers[p][ITEM_NAME] not in giver_names
+                and receiver_raw[p] not in giver_values
+                and not (thresholds.value_only and receivers[p][ITEM_VALUE] <= 0)
+                for p in range(n)
+            ]
+            lo, hi = map(float, receiving_window(giving_raw, thresholds, allow_edge))
+            giving_sum = sum(score[k] for k in giver_idx)
+
+            for j in receiver_range:
+                if not sizes_allowed(mode, i, j) or j > n:
+                    continue
+                giving_score = giving_sum * bulk(i) * (thresholds.upgrade_penalty_multiplier if i < j else 1)
+                factor = bulk(j) * (thresholds.upgrade_penalty_multiplier if j < i else 1)
+                if sum(suffix_top[0][:j]) * factor - giving_score + ROUNDING_SLACK < heap.threshold():
+                    continue
+
+                def descend(start, remaining, picked, raw_sum, score_sum):
+                    if remaining == 0:
+                        pending.append((giver_idx, tuple(offset + p for p in picked)))
+                        if len(pending) >= batch_size:
+                            flush()
+                        return
+                    for p in range(start, n - remaining + 1):
+                        if not eligible[p] or (p > start and receiver_groups[p] == receiver_groups[p - 1]):
+                            continue
+                        total = raw_sum + receiver_raw[p]
+                        rest = remaining - 1
+                        if total + cumulative[p + 1 + rest] - cumulative[p + 1] < lo:
+                            break
+                        if total + cumulative[n] - cumulative[n - rest] > hi:
+                            continue
+                        bound = (score_sum + receiver_score[p] + sum(suffix_top[p + 1][:rest])) * factor - giving_score
+                        if bound <= 0 or bound + ROUNDING_SLACK < heap.threshold():
+                            continue
+                        picked.append(p)
+                        descend(p + 1, rest, picked, total, score_sum + receiver_score[p])
+                        picked.pop()
+
+                descend(0, j, [], 0, 0.0)
+            if len(pending) >= batch_size:
+                flush()
+    flush()
+    stats["evaluated"] = evaluated
+    stats["elapsed"] = time.time() - started
+    return best_trades(heap, givers, receivers, offset, alternatives), stats
+
+# Largest number of item combinations per size a value-window index is built for,
+# bigger inventories fall back to streaming every pair.
+WINDOW_INDEX_LIMIT = 2_000_000
+
+def window_fits(item_count, max_size, limit=WINDOW_INDEX_LIMIT):
+    return math.comb(item_count, min(max_size, item_count)) <= limit if item_count else True
+
+class CandidateBatch:
+    """Padded giving/receiving index arrays of one batch, batch[i] gives candidate i as position tuples."""
+    def __init__(self, giving, receiving, sentinel):
+        self.giving = giving
+        self.receiving = receiving
+        self.sentinel = sentinel
+
+    def __len__(self):
+        return len(self.giving)
+
+    def __getitem__(self, index):
+        return (
+            tuple(k for k in self.giving[index].tolist() if k != self.sentinel),
+            tuple(k for k in self.receiving[index].tolist() if k != self.sentinel)
+        )
+
+async def next_batch(batches):
+    """
+    Next batch of a batch stream or None. Streams can spend a while on candidates they filter
+    out, so batches are put together in a worker thread, away from the event loop.
+    """
+    return await asyncio.to_thread(next, batches, None)
+
+def iter_tuple_batches(table, candidates, offset, giver_max, receiver_max, batch_size):
+    while True:
+        batch = [(giver_idx, tuple(offset + k for k in receiver_idx)) for giver_idx, receiver_idx in itertools.islice(candidates, batch_size)]
+        if not batch:
+            return
+        giving = table.pack([giver_idx for giver_idx, _ in batch], giver_max)
+        receiving = table.pack([receiver_idx for _, receiver_idx in batch], receiver_max)
+        yield giving, receiving, batch
+
+# Giver combinations taken from one (giver size, receiver size) pairing before moving on to the next.
+WINDOW_STEP = 512
+
+def iter_window_batches(
+    givers, receivers, table, thresholds,
+    giver_combos, receiver_index,
+    giver_min, giver_max, receiver_min, receiver_max,
+    allow_edge, mode, max_pairs, batch_size,
+    stats=None, offset=None
+):
+    """
+    Meet-in-the-middle candidate stream. Giver combinations come from `giver_combos` (see
+    prepare_search) and are matched, by bisection over `receiver_index`'s sorted totals, only
+    to receiver combinations
+    inside their receiving_window. Yields (giving, receiving, CandidateBatch) like iter_tuple_batches,
+    with generate_possible_trades' name and value filters applied.
+
+    The most promising giver combinations of every size pairing go first (giver_combos keeps
+    them in that order), a WINDOW_STEP slice of
+    each in turn, so a search cut short still saw the best part of the space. `stats["planned"]`
+    and `stats["covered"]` count window pairs in total and so far. `offset` is the table row of
+    the first receiver, by default right after the givers.
+    """
+    stats = stats if stats is not None else {}
+    offset = len(givers) if offset is None else offset
+    sentinel = table.sentinel
+    names = {}
+    giver_names = np.array([names.setdefault(item[ITEM_NAME], len(names)) for item in givers], dtype=np.int64)
+    receiver_names = np.array([names.setdefault(item[ITEM_NAME], len(names)) for item in receivers], dtype=np.int64)
+    giver_raw = table.raw[:offset]
+    receiver_raw = table.raw[offset:offset + len(receivers)]
+
+    def pad(idx, width):
+        return np.hstack([idx, np.full((len(idx), width - idx.shape[1]), sentinel, dtype=np.int32)]).astype(np.int32)
+
+    giver_range, receiver_range = search_ranges(
+        len(givers), len(receivers),
+        giver_min, giver_max, receiver_min, receiver_max, mode
+    )
+    pairings = []
+    for i in giver_range:
+        giver_positions = giver_combos[i]
+        if not len(giver_positions):
+            continue
+        giver_totals = giver_raw[giver_positions].sum(axis=1)
+        lo, hi = receiving_window(giver_totals, thresholds, allow_edge)
+        for j in receiver_range:
+            if sizes_allowed(mode, i, j):
+                receiver_positions, receiver_totals = receiver_index.select(j)
+                pairings.append((giver_positions, lo, hi, receiver_positions, receiver_totals))
+    stats["planned"] = sum(combos.window_size(lo, hi, receiver_totals) for _, lo, hi, _, receiver_totals in pairings)
+    stats["covered"] = 0
+
+    emitted = 0
+    for first in range(0, max((len(pairing[0]) for pairing in pairings), default=0), WINDOW_STEP):
+        for giver_positions, lo, hi, receiver_positions, receiver_totals in pairings:
+            step = slice(first, first + WINDOW_STEP)
+            for g, r in combos.window_join(lo[step], hi[step], receiver_totals, batch_size):
+                stats["covered"] += len(g)
+                giving = giver_positions[step][g]
+                receiving = receiver_positions[r]
+                clash = (giver_names[giving][:, :, None] == receiver_names[receiving][:, None, :]).any(axis=(1, 2))
+                clash |= (giver_raw[giving][:, :, None] == receiver_raw[receiving][:, None, :]).any(axis=(1, 2))
+                giving, receiving = giving[~clash], receiving[~clash] + offset
+                if max_pairs:
+                    giving, receiving = giving[:max_pairs - emitted], receiving[:max_pairs - emitted]
+                if not len(giving):
+                    continue
+                emitted += len(giving)
+                giving, receiving = pad(giving, giver_max), pad(receiving, receiver_max)
+                yield giving, receiving, CandidateBatch(giving, receiving, sentinel)
+                if max_pairs and emitted >= max_pairs:
+                    return
+
+async def branch_and_bound_trade(
     giver_items, receiver_items, settings,
     giver_min=1, giver_max=4,
     receiver_min=1, receiver_max=4,
     allow_edge=False, batch_size=10,
-    mode=None, max_pairs=None, min_trade_send_value_total=0
+    mode=None, min_trade_send_value_total=0,
+    score_table=None, giver_index=None,
+    time_budget=None, stats=None, alternatives=1
 ):
-    all_possible_trades = await generate_possible_trades(
-        giver_items, receiver_items,
-        giver_min, giver_max,
-        receiver_min, receiver_max,
-        mode, max_pairs, min_trade_send_value_total
+    """
+    Exact depth-first search over value-sorted items. Receiver subtrees whose raw total can no
+    longer land in the feasible window, or whose best reachable score cannot beat the current
+    best profit score, are cut. Returns the same trade as the exhaustive search, without max_pairs.
+    """
+    stats = stats if stats is not None else {}
+    givers, giver_combos, receivers, table = await asyncio.to_thread(
+        prepare_search,
+        giver_items, receiver_items, settings,
+        giver_max, receiver_max, allow_edge, min_trade_send_value_total,
+        score_table, giver_index, stats
     )
-    all_possible_trades = sorted(
-        all_possible_trades,
-        key=lambda trade: sum([item[ITEM_VALUE] if item[ITEM_VALUE] != -1 else item[ITEM_RAP] for item in trade['receiving_items']]) -
-                        sum([item[ITEM_VALUE] if item[ITEM_VALUE] != -1 else item[ITEM_RAP] for item in trade['giving_items']]),
-        reverse=True
+    trade, search_stats = await backends.get_backend(settings).run(
+        _branch_and_bound,
+        givers, receivers, table, build_thresholds(settings),
+        giver_min, giver_max, receiver_min, receiver_max,
+        allow_edge, batch_size, mode, min_trade_send_value_total,
+        giver_combos, time.time() + time_budget if time_budget else None,
+        pool_size(settings, alternatives), alternatives
     )
-    
-    best_trade_info = None
-    best_profit_score = 0
-    results = []
-
-    loop = asyncio.get_event_loop()
-    for i in range(0, len(all_possible_trades), batch_size):
-        batch = all_possible_trades[i:i + batch_size]
-        batch_results = await loop.run_in_executor(
-            executor, sync_batch_eval, batch, settings, allow_edge
+    stats.update(search_stats)
+    stats.update({"timed_out": not search_stats["complete"], "truncated": False})
+    return trade
+
+def giver_side(giver_items, giver_index, giver_max, min_trade_send_value_total=0):
+    """
+    Giver rows and per-size giver position arrays for a search, most promising first. With a
+    combos.CombinationIndex that covers `giver_max` both come straight from the index, otherwise
+    giver_items are sorted here and there are no precomputed combinations.
+    """
+    if giver_index is None or giver_max > giver_index.max_size:
+        return sort_items(giver_items), None
+    return giver_index.items(), index_combos(giver_index, giver_max, min_trade_send_value_total)
+
+def index_combos(index, max_size, min_trade_send_value_total=0):
+    return {size: index.promising(size, min_trade_send_value_total)[0] for size in range(1, max_size + 1)}
+
+def prune_dominated(givers, receivers, thresholds, giver_max, receiver_max, allow_edge, giver_scores, receiver_scores):
+    """
+    Dominance pre-pass over two sort_items lists, returns the positions worth searching on each side.
+
+    Items with the same raw value and the same ratio worth are interchangeable for every check in
+    evaluate_trade, only their score differs. A trade takes at most receiver_max of them, so only
+    the receiver_max best scoring are kept on the receiving side and the giver_max lowest scoring
+    on the giving side. Items sharing a name with the other side are never collapsed, since the
+    name filter may rule some of them out. Items no accepted trade can hold are dropped: receiving
+    items without value in value_only mode, and items worth more than max_edge_value times
+    everything the other side could put up. The best profit score is never lost.
+    """
+    giver_raw = [raw_value(item) for item in givers]
+    receiver_raw = [raw_value(item) for item in receivers]
+    bounded = all(value >= 0 for value in giver_raw + receiver_raw)
+    edge = thresholds.max_edge_value * (1 + 1e-9)
+    giving_cap = sum(sorted(giver_raw, reverse=True)[:giver_max]) * edge
+    receiving_cap = sum(sorted(receiver_raw, reverse=True)[:receiver_max]) * edge
+
+    def keep(items, raw, scores, other_names, limit, best, dropped):
+        kept = []
+        groups = {}
+        for p, item in enumerate(items):
+            if dropped(p):
+                continue
+            if item[ITEM_NAME] in other_names:
+                kept.append(p)
+                continue
+            worth = (item[ITEM_VALUE] + item[ITEM_RAP]) / 2 if item[ITEM_VALUE] != -1 else item[ITEM_RAP]
+            groups.setdefault((raw[p], worth), []).append(p)
+        for members in groups.values():
+            kept.extend(sorted(members, key=lambda p: -scores[p] if best else scores[p])[:limit])
+        return sorted(kept)
+
+    giver_keep = keep(
+        givers, giver_raw, giver_scores, {item[ITEM_NAME] for item in receivers}, giver_max, False,
+        lambda p: bounded and giver_raw[p] > receiving_cap
+    )
+    receiver_keep = keep(
+        receivers, receiver_raw, receiver_scores, {item[ITEM_NAME] for item in givers}, receiver_max, True,
+        lambda p: (thresholds.value_only and receivers[p][ITEM_VALUE] <= 0) or (allow_edge and bounded and receiver_raw[p] > giving_cap)
+    )
+    return giver_keep, receiver_keep
+
+def prepare_search(
+    giver_items, receiver_items, settings,
+    giver_max, receiver_max, allow_edge, min_trade_send_value_total,
+    score_table=None, giver_index=None, stats=None
+):
+    """
+    Shared setup of both search modes: giver rows and combinations (from `giver_index` when it
+    fits), the sorted receiver rows, the dominance pre-pass and the item table over both sides.
+    `stats` gets the number of items the pre-pass removed from each side.
+    """
+    givers, giver_combos = giver_side(giver_items, giver_index, giver_max, min_trade_send_value_total)
+    givers, giver_combos, receivers = prune_search(
+        givers, giver_combos, sort_items(receiver_items), settings,
+        giver_max, receiver_max, allow_edge, score_table, stats
+    )
+    table = build_item_table(givers + receivers, settings, score_table)
+    return givers, giver_combos, receivers, table
+
+def prune_search(givers, giver_combos, receivers, settings, giver_max, receiver_max, allow_edge, score_table=None, stats=None):
+    """
+    Applies prune_dominated to a search's sides. Givers with precomputed combinations keep their
+    positions and lose the combinations holding a pruned item instead.
+    """
+    pruned_givers = pruned_receivers = 0
+    if settings.get("performance", {}).get("prune", True) and givers and receivers:
+        giver_keep, receiver_keep = prune_dominated(
+            givers, receivers, build_thresholds(settings), giver_max, receiver_max, allow_edge,
+            item_scores(givers, settings, score_table), item_scores(receivers, settings, score_table)
         )
-        results.extend(batch_results)
-
-    for result in results:
-        trade = result['trade']
-        decision = result['decision']
-        giving_score = result['giving_score']
-        receiving_score = result['receiving_score']
-        
-        profit_score = receiving_score - giving_score
-        
-        if decision == 1 and profit_score > best_profit_score:
-            best_profit_score = profit_score
-            best_trade_info = {
-                'trade': trade,
-                'giving_score': giving_score,
-                'receiving_score': receiving_score
-            }
-
-    return best_trade_info
+        pruned_givers = len(givers) - len(giver_keep)
+        pruned_receivers = len(receivers) - len(receiver_keep)
+        receivers = [receivers[p] for p in receiver_keep]
+        if giver_combos is None:
+            givers = [givers[p] for p in giver_keep]
+        elif pruned_givers:
+            pruned = np.setdiff1d(np.arange(len(givers)), giver_keep)
+            giver_combos = {size: positions[~np.isin(positions, pruned).any(axis=1)] for size, positions in giver_combos.items()}
+    if stats is not None:
+        stats.update({"pruned_givers": pruned_givers, "pruned_receivers": pruned_receivers})
+    return givers, giver_combos, receivers
+
+async def find_best_trade(
+    giver_items, receiver_items, settings,
+    giver_min=1, giver_max=4,
+    receiver_min=1, receiver_max=4,
+    allow_edge=False, batch_size=10,
+    mode=None, max_pairs=None, min_trade_send_value_total=0,
+    score_table=None, giver_index=None,
+    time_budget=None, stats=None, alternatives=1
+):
+    """
+    Best trade between giver_items and receiver_items. `giver_index`, a combos.CombinationIndex kept in
+    sync with giver_items, saves re-enumerating our own combinations for every partner.
+
+    With a `time_budget` in seconds the search stops once it runs out and returns the best trade
+    found so far. A `stats` dict is filled with the number of candidates evaluated, the covered
+    share of the search space when known, whether the search completed, ran out of time
+    ('timed_out') or stopped at max_pairs ('truncated'), how long it took and how many items the
+    dominance pre-pass removed.
+
+    With `alternatives` above 1 the result also lists up to that many - 1 runner-up trades under
+    'alternatives', see best_trades().
+    """
+    if settings.get("performance", {}).get("search_mode") == "branch_and_bound":
+        return await branch_and_bound_trade(
+            giver_items, receiver_items, settings,
+            giver_min, giver_max, receiver_min, receiver_max,
+            allow_edge, batch_size, mode, min_trade_send_value_total,
+            score_table, giver_index,
+            time_budget, stats, alternatives
+        )
+
+    started = time.time()
+    deadline = started + time_budget if time_budget else None
+    performance = settings.get("performance", {})
+    stats = stats if stats is not None else {}
+    thresholds = build_thresholds(settings)
+    window_stats = {}
+
+    def setup():
+        # Pruning, the item table and the combination indexes take a while on big inventories,
+        # so they are built in a worker thread like the batches themselves.
+        givers, giver_combos, receivers, table = prepare_search(
+            giver_items, receiver_items, settings,
+            giver_max, receiver_max, allow_edge, min_trade_send_value_total,
+            score_table, giver_index, stats
+        )
+        offset = len(givers)
+
+        # Candidates are streamed a batch at a time and only the best ones are kept around. When
+        # both sides fit a value-window index, only pairs whose totals can be accepted are generated.
+        limit = performance.get("window_index_limit", WINDOW_INDEX_LIMIT)
+        if giver_combos is None and window_fits(len(givers), giver_max, limit):
+            giver_combos = index_combos(combos.CombinationIndex.of(givers, giver_max, table.score[:offset]), giver_max, min_trade_send_value_total)
+        if giver_combos is not None and window_fits(len(receivers), receiver_max, limit):
+            batches = iter_window_batches(
+                givers, receivers, table, thresholds,
+                giver_combos, combos.CombinationIndex.of(receivers, receiver_max),
+                giver_min, giver_max, receiver_min, receiver_max,
+                allow_edge, mode, max_pairs, batch_size,
+                window_stats
+            )
+        else:
+            candidates = iter_trade_indices(
+                givers, receivers,
+                giver_min, giver_max, receiver_min, receiver_max,
+                mode, max_pairs, min_trade_send_value_total,
+                giver_combos
+            )
+            batches = iter_tuple_batches(table, candidates, offset, giver_max, receiver_max, batch_size)
+        return givers, receivers, table, batches
+
+    givers, receivers, table, batches = await asyncio.to_thread(setup)
+    offset = len(givers)
+
+    heap = CandidateHeap(pool_size(settings, alternatives))
+    evaluated = 0
+    complete = True
+
+    with backends.get_backend(settings).share(table) as search:
+        while True:
+            produced = await next_batch(batches)
+            if produced is None:
+                break
+            giving, receiving, batch = produced
+            result = await search.evaluate(giving, receiving, thresholds, allow_edge)
+            push_results(heap, result, batch, evaluated)
+            evaluated += len(batch)
+            if deadline and time.time() >= deadline:
+                complete = False
+                break
+
+    truncated = bool(max_pairs) and evaluated >= max_pairs
+    stats.update({
+        "evaluated": evaluated,
+        "coverage": window_stats["covered"] / window_stats["planned"] if window_stats.get("planned") else None,
+        "complete": complete and not truncated,
+        "timed_out": not complete,
+        "truncated": truncated,
+        "elapsed": time.time() - started,
+    })
+    return best_trades(heap, givers, receivers, offset, alternatives)
+
+async def find_best_trades(
+    giver_items, partners, settings,
+    giver_min=1, giver_max=4,
+    receiver_min=1, receiver_max=4,
+    allow_edge=False, batch_size=10,
+    mode=None, max_pairs=None, min_trade_send_value_total=0,
+    score_table=None, giver_index=None,
+    time_budget=None, stats=None, alternatives=1
+):
+    """
+    find_best_trade against several partners at once. `partners` maps a key, like a user id, to
+    that partner's receiver_items; the result maps the same keys to their best trade or None.
+
+    Our side is only set up once: giver rows and combinations, one item table holding every
+    partner's items and one backend share. A batch of every partner is evaluated per call, so a
+    burst of partners runs at the throughput of one big search. `time_budget` covers the whole
+    batch and `stats` gets find_best_trade's stats dict per partner. In branch_and_bound mode, or
+    for inventories too large to index, partners are searched one by one with find_best_trade.
+    """
+    started = time.time()
+    deadline = started + time_budget if time_budget else None
+    performance = settings.get("performance", {})
+    limit = performance.get("window_index_limit", WINDOW_INDEX_LIMIT)
+    stats = stats if stats is not None else {}
+    thresholds = build_thresholds(settings)
+    results = dict.fromkeys(partners)
+
+    def setup():
+        # Our side, every partner's pruned side, the shared item table and the combination
+        # indexes are built in a worker thread, away from the event loop.
+        givers, giver_combos = giver_side(giver_items, giver_index, giver_max, min_trade_send_value_total)
+        if giver_combos is None and window_fits(len(givers), giver_max, limit):
+            giver_scores = item_scores(givers, settings, score_table)
+            giver_combos = index_combos(combos.CombinationIndex.of(givers, giver_max, giver_scores), giver_max, min_trade_send_value_total)
+
+        sides, one_by_one = {}, []
+        for key, receiver_items in partners.items():
+            stats[key] = {}
+            if performance.get("search_mode") == "branch_and_bound" or giver_combos is None:
+                one_by_one.append(key)
+                continue
+            _, partner_combos, receivers = prune_search(
+                givers, giver_combos, sort_items(receiver_items), settings,
+                giver_max, receiver_max, allow_edge, score_table, stats[key]
+            )
+            if window_fits(len(receivers), receiver_max, limit):
+                sides[key] = (partner_combos, receivers)
+            else:
+                one_by_one.append(key)
+
+        rows, offsets = list(givers), {}
+        for key, (_, receivers) in sides.items():
+            offsets[key] = len(rows)
+            rows.extend(receivers)
+        table = build_item_table(rows, settings, score_table)
+
+        window_stats = {key: {} for key in sides}
+        streams = {
+            key: iter_window_batches(
+                givers, receivers, table, thresholds,
+                partner_combos, combos.CombinationIndex.of(receivers, receiver_max),
+                giver_min, giver_max, receiver_min, receiver_max,
+                allow_edge, mode, max_pairs, batch_size,
+                window_stats[key], offsets[key]
+            )
+            for key, (partner_combos, receivers) in sides.items()
+        }
+        return givers, sides, one_by_one, table, offsets, window_stats, streams
+
+    givers, sides, one_by_one, table, offsets, window_stats, streams = await asyncio.to_thread(setup)
+    heaps = {key: CandidateHeap(pool_size(settings, alternatives)) for key in sides}
+    evaluated = dict.fromkeys(sides, 0)
+
+    with backends.get_backend(settings).share(table) as search:
+        while streams and not (deadline and time.time() >= deadline):
+            parts = []
+            for key in list(streams):
+                batch = await next_batch(streams[key])
+                if batch is None:
+                    del streams[key]
+                else:
+                    parts.append((key, batch))
+            if not parts:
+                break
+            result = await search.evaluate(
+                np.vstack([giving for _, (giving, _, _) in parts]),
+                np.vstack([receiving for _, (_, receiving, _) in parts]),
+                thresholds, allow_edge
+            )
+            start = 0
+            for key, (_, _, batch) in parts:
+                end = start + len(batch)
+                push_results(heaps[key], engine.BatchResult(*(field[start:end] for field in result)), batch, evaluated[key])
+                evaluated[key] += len(batch)
+                start = end
+
+    for key, (_, receivers) in sides.items():
+        results[key] = best_trades(heaps[key], givers, receivers, offsets[key], alternatives)
+        planned = window_stats[key].get("planned")
+        truncated = bool(max_pairs) and evaluated[key] >= max_pairs
+        stats[key].update({
+            "evaluated": evaluated[key],
+            "coverage": window_stats[key]["covered"] / planned if planned else None,
+            "complete": key not in streams and not truncated,
+            "timed_out": key in streams,
+            "truncated": truncated,
+            "elapsed": time.time() - started,
+        })
+
+    for key in one_by_one:
+        remaining = max(deadline - time.time(), 1e-3) if deadline else None
+        results[key] = await find_best_trade(
+            giver_items, partners[key], settings,
+            giver_min, giver_max, receiver_min, receiver_max,
+            allow_edge, batch_size, mode, max_pairs, min_trade_send_value_total,
+            score_table, giver_index,
+            remaining, stats[key], alternatives
+        )
+    return results
+
+def size_ranges(settings, mode):
+    """(giver_min, giver_max, receiver_min, receiver_max) of a search in `mode`."""
+    own, other = (settings["upgrade"], settings["downgrade"]) if mode == "upgrade" else (settings["downgrade"], settings["upgrade"])
+    return own["min_items"], own["max_items"], other["min_items"], other["max_items"]
+
+def trade_shapes(settings):
+    """(giving size, receiving size) pairs generate_trade can ask for with any configured trade method."""
+    shapes = set()
+    for mode in settings["modes"]["trade_methods"]:
+        giver_min, giver_max, receiver_min, receiver_max = size_ranges(settings, mode)
+        for i in range(giver_min, giver_max + 1):
+            for j in range(receiver_min, receiver_max + 1):
+                if sizes_allowed(mode, i, j):
+                    shapes.add((i, j))
+    return shapes
+
+def _seed_groups(items, pool, groups):
+    """The copy groups of `pool` holding `items`, as a sorted multiset; items not in the pool are left out."""
+    first, free = {}, Counter()
+    for p, item in enumerate(pool):
+        first.setdefault(tuple(item), groups[p])
+        free[tuple(item)] += 1
+    picked = []
+    for item in items:
+        if free[tuple(item)]:
+            free[tuple(item)] -= 1
+            picked.append(first[tuple(item)])
+    return tuple(sorted(picked))
+
+def _neighbours(side, copies):
+    """Multisets of copy groups one removal, addition or swap away from `side`."""
+    held = Counter(side)
+    free = [group for group, count in copies.items() if held[group] < count]
+    found = {tuple(sorted(side + (group,))) for group in free}
+    for group in held:
+        rest = list(side)
+        rest.remove(group)
+        found.add(tuple(rest))
+        found.update(tuple(sorted(rest + [other])) for other in free if other != group)
+    return found
+
+async def local_counter(
+    giving_items, receiving_items, giver_items, receiver_items, settings,
+    shapes=None, allow_edge=True, score_table=None,
+    rounds=3, beam=8, alternatives=1, stats=None
+):
+    """
+    Counter-offer search seeded with a trade we were offered: `giving_items` and `receiving_items`
+    are its sides, `giver_items` and `receiver_items` everything either side could trade. Each
+    round looks at every trade one item swap, addition or removal (on either side) away from the
+    `beam` best trades of the last round, scored like evaluate_trade with the same name and value
+    filters as generate_possible_trades. Only trades of the `shapes` from trade_shapes() count.
+    Returns the best accepted trade like find_best_trade does, or None.
+    """
+    givers, receivers = sort_items(giver_items), sort_items(receiver_items)
+    if not givers or not receivers:
+        return None
+    shapes = shapes if shapes is not None else trade_shapes(settings)
+    offset = len(givers)
+    table = build_item_table(givers + receivers, settings, score_table)
+    thresholds = build_thresholds(settings)
+    giver_groups, receiver_groups = copy_groups(givers), copy_groups(receivers)
+    giver_copies, receiver_copies = Counter(giver_groups), Counter(receiver_groups)
+    receiver_raw = [raw_value(item) for item in receivers]
+
+    def positions(side, base):
+        return tuple(base + group + k for group, count in sorted(Counter(side).items()) for k in range(count))
+
+    def clash(giving, receiving):
+        names = {givers[group][ITEM_NAME] for group in giving}
+        values = {raw_value(givers[group]) for group in giving}
+        return any(receivers[group][ITEM_NAME] in names or receiver_raw[group] in values for group in receiving)
+
+    start = (_seed_groups(giving_items, givers, giver_groups), _seed_groups(receiving_items, receivers, receiver_groups))
+    frontier, seen = [start], {start}
+    heap = CandidateHeap(pool_size(settings, alternatives))
+    evaluated = 0
+    time_slice = TimeSlice(settings.get("performance", {}).get("time_slice", TIME_SLICE))
+
+    with backends.get_backend(settings).share(table) as search:
+        for _ in range(rounds):
+            states = []
+            for giving, receiving in frontier:
+                states.extend((side, receiving) for side in _neighbours(giving, giver_copies))
+                states.extend((giving, side) for side in _neighbours(receiving, receiver_copies))
+                await time_slice.pause()
+            states = [state for state in dict.fromkeys(states) if state not in seen and state[0] and state[1] and not clash(*state)]
+            if not states:
+                break
+            seen.update(states)
+
+            # Trades of other shapes are still walked through, they just never get picked.
+            payloads = [(positions(giving, 0), positions(receiving, offset)) for giving, receiving in states]
+            result = await search.evaluate(
+                table.pack([giving for giving, _ in payloads]), table.pack([receiving for _, receiving in payloads]),
+                thresholds, allow_edge
+            )
+            shape_gap = np.array([min(abs(len(g) - i) + abs(len(r) - j) for i, j in shapes) for g, r in states])
+            result = result._replace(decision=result.decision & (shape_gap == 0))
+            push_results(heap, result, payloads, evaluated)
+            evaluated += len(states)
+
+            # Accepted trades lead the next round, best first. The rest follow by how far their
+            # shape and receiving total are from anything acceptable, so the walk heads that way.
+            lo, hi = receiving_window(result.giving_raw.astype(np.float64), thresholds, allow_edge)
+            value_gap = np.maximum(np.maximum(lo - result.receiving_raw, result.receiving_raw - hi), 0) / np.maximum(result.giving_raw, 1)
+            profit = result.receiving_score - result.giving_score
+            order = np.lexsort((-profit, shape_gap + value_gap, ~result.decision))
+            frontier = [states[k] for k in order[:beam].tolist()]
+
+    if stats is not None:
+        stats["evaluated"] = evaluated
+    return best_trades(heap, givers, receivers, offset, alternatives)
@@ -0,0 +1,165 @@
+import asyncio
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+from . import engine
+
+# Item table layout inside a shared memory block: a (rows, 6) int64 matrix followed by the
+# raw (int64), worth (float64) and score (float64) columns, 9 eight-byte cells per row.
+_CELLS_PER_ROW = 9
+_MAX_ATTACHED_TABLES = 4
+
+TableDescriptor = Tuple[str, int]
+
+
+def _table_view(buffer: Any, rows: int) -> engine.ItemTable:
+    return engine.ItemTable(
+        matrix=np.ndarray((rows, 6), dtype=np.int64, buffer=buffer, offset=0),
+        raw=np.ndarray((rows,), dtype=np.int64, buffer=buffer, offset=rows * 48),
+        worth=np.ndarray((rows,), dtype=np.float64, buffer=buffer, offset=rows * 56),
+        score=np.ndarray((rows,), dtype=np.float64, buffer=buffer, offset=rows * 64),
+    )
+
+
+def _share_table(table: engine.ItemTable) -> Tuple[shared_memory.SharedMemory, TableDescriptor]:
+    rows = len(table.score)
+    block = shared_memory.SharedMemory(create=True, size=rows * _CELLS_PER_ROW * 8)
+    view = _table_view(block.buf, rows)
+    view.matrix[:] = table.matrix
+    view.raw[:] = table.raw
+    view.worth[:] = table.worth
+    view.score[:] = table.score
+    del view
+    return block, (block.name, rows)
+
+
+# Worker side: tables stay attached between batches of the same search.
+_attached: "OrderedDict[str, Tuple[shared_memory.SharedMemory, engine.ItemTable]]" = OrderedDict()
+
+
+def _attached_table(descriptor: TableDescriptor) -> engine.ItemTable:
+    name, rows = descriptor
+    if name in _attached:
+        _attached.move_to_end(name)
+        return _attached[name][1]
+
+    block = shared_memory.SharedMemory(name=name)
+    _attached[name] = (block, _table_view(block.buf, rows))
+    while len(_attached) > _MAX_ATTACHED_TABLES:
+        old_block, old_table = _attached.popitem(last=False)[1]
+        del old_table
+        try:
+            old_block.close()
+        except BufferError:
+            pass
+    return _attached[name][1]
+
+
+def _evaluate_shared(descriptor: TableDescriptor, giving: np.ndarray, receiving: np.ndarray, thresholds: engine.Thresholds, allow_edge: bool) -> engine.BatchResult:
+    return engine.evaluate(_attached_table(descriptor), giving, receiving, thresholds, allow_edge)
+
+
+class Search:
+    """Evaluation handle for one search, bound to the item table it was opened with."""
+    def __init__(self, backend: "Backend", table: engine.ItemTable) -> None:
+        self.backend = backend
+        self.table = table
+
+    async def evaluate(self, giving: np.ndarray, receiving: np.ndarray, thresholds: engine.Thresholds, allow_edge: bool = False) -> engine.BatchResult:
+        return await self.backend.run(engine.evaluate, self.table, giving, receiving, thresholds, allow_edge)
+
+
+class SharedSearch(Search):
+    def __init__(self, backend: "Backend", table: engine.ItemTable, descriptor: TableDescriptor) -> None:
+        super().__init__(backend, table)
+        self.descriptor = descriptor
+
+    async def evaluate(self, giving: np.ndarray, receiving: np.ndarray, thresholds: engine.Thresholds, allow_edge: bool = False) -> engine.BatchResult:
+        return await self.backend.run(_evaluate_shared, self.descriptor, giving, receiving, thresholds, allow_edge)
+
+
+class Backend:
+    """
+    Runs CPU-bound search work away from the event loop. Without an executor the work runs
+    inline, which is only sensible for tiny searches or benchmarking.
+    """
+    name = "inline"
+
+    def __init__(self, executor: Optional[Executor] = None) -> None:
+        self.executor = executor
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self.executor is None:
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    @contextmanager
+    def share(self, table: engine.ItemTable) -> Iterator[Search]:
+        yield Search(self, table)
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ThreadBackend(Backend):
+    name = "thread"
+
+    def __init__(self, workers: int) -> None:
+        super().__init__(ThreadPoolExecutor(max_workers=workers))
+
+
+class ProcessBackend(Backend):
+    """
+    Evaluates batches in worker processes. The item table is copied once per search into a
+    shared memory block that workers attach to, so batches only carry index arrays.
+    """
+    name = "process"
+
+    def __init__(self, workers: int) -> None:
+        super().__init__(ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")))
+
+    @contextmanager
+    def share(self, table: engine.ItemTable) -> Iterator[Search]:
+        block, descriptor = _share_table(table)
+        try:
+            yield SharedSearch(self, table, descriptor)
+        finally:
+            block.close()
+            block.unlink()
+
+
+BACKENDS = {
+    "inline": lambda workers: Backend(),
+    "thread": ThreadBackend,
+    "process": ProcessBackend,
+}
+
+_backends: Dict[Tuple[str, int], Backend] = {}
+
+
+def get_backend(settings: dict) -> Backend:
+    """Backend picked by the `performance` block of the algorithm settings, shared process-wide."""
+    performance = settings.get("performance", {})
+    kind = performance.get("backend", "thread")
+    workers = performance.get("workers") or os.cpu_count() or 1
+    if kind not in BACKENDS:
+        raise ValueError(f"Unknown evaluation backend '{kind}', expected one of {', '.join(BACKENDS)}")
+
+    key = (kind, workers)
+    if key not in _backends:
+        _backends[key] = BACKENDS[kind](workers)
+    return _backends[key]
+
+
+def shutdown() -> None:
+    for backend in _backends.values():
+        backend.shutdown()
+    _backends.clear()
@@ -0,0 +1,96 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+# Default for LRUCache.get() that tells a miss apart from a cached None.
+MISSING = object()
+
+
+class LRUCache:
+    """
+    Bounded mapping that drops its least recently used entry once it holds `max_size` of them.
+    With a `ttl` in seconds entries also expire that long after they were stored. None is a
+    valid value, which is how "nothing there" results get cached, so look entries up with `in`
+    or get(key, MISSING). `hits` and `misses` count get() calls.
+    """
+    def __init__(self, max_size: int = 512, ttl: Optional[float] = None, clock: Callable[[], float] = time.monotonic) -> None:
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _live(self, key: Hashable) -> bool:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        if self.ttl is not None and self.clock() - entry[0] >= self.ttl:
+            del self._entries[key]
+            return False
+        return True
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._live(key)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if not self._live(key):
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return self._entries[key][1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (self.clock(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def snapshot(self) -> List[Tuple[Hashable, float, Any]]:
+        """Live entries as (key, stored at, value), least recently used first, for restore()."""
+        return [(key, stored_at, value) for key, (stored_at, value) in list(self._entries.items()) if self._live(key)]
+
+    def restore(self, entries: Iterable[Tuple[Hashable, float, Any]]) -> None:
+        """Puts back snapshot() entries with their original store times, skipping expired ones."""
+        for key, stored_at, value in entries:
+            if self.ttl is None or self.clock() - stored_at < self.ttl:
+                self._entries[key] = (stored_at, value)
+                self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent fetches: while a fetch for a key is running, run() with the same key
+    waits for that one instead of starting another, counted in `joined`. A caller giving up
+    doesn't cancel the fetch for the others.
+    """
+    def __init__(self) -> None:
+        self.joined = 0
+        self._flights: Dict[Hashable, "asyncio.Future[Any]"] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._flights
+
+    async def run(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = asyncio.ensure_future(fetch())
+            self._flights[key] = flight
+            flight.add_done_callback(lambda _: self._flights.pop(key, None))
+        else:
+            self.joined += 1
+        return await asyncio.shield(flight)
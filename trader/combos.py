@@ -0,0 +1,299 @@
+from collections import Counter
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Above this many added copies a sync re-enumerates everything at once instead of merging
+# each copy's combinations in one by one.
+_REBUILD_AFTER = 8
+
+
+def _raw_value(item: Sequence[Any]) -> int:
+    return item[3] if item[3] != -1 else item[2]
+
+
+class _Unscored:
+    key = None
+
+    def score(self, item: Sequence[Any]) -> float:
+        return 0.0
+
+
+class CombinationIndex:
+    """
+    Item combinations of 1..max_size items, copies counted as multisets, kept sorted by raw value
+    total along with their item score sums. Adding or removing a copy only touches the
+    combinations holding that item, and a catalog refresh reprices the existing combinations
+    instead of enumerating them again. The bot keeps one for its own inventory; partner sides
+    get a throwaway one per search through CombinationIndex.of().
+    """
+    def __init__(self, max_size: int = 4) -> None:
+        self.max_size = max_size
+        self.version: Optional[Hashable] = None
+        self.revision = 0
+        self._slots: Dict[Hashable, int] = {}
+        self._rows: List[Sequence[Any]] = []
+        self._counts: List[int] = []
+        self._raw = np.zeros(0, dtype=np.int64)
+        self._score = np.zeros(0, dtype=np.float64)
+        self._clear()
+
+    def _clear(self) -> None:
+        # combos[k] holds slot ids in non-decreasing order, one row per multiset.
+        self.combos = {k: np.zeros((0, k), dtype=np.int32) for k in range(1, self.max_size + 1)}
+        self.totals = {k: np.zeros(0, dtype=np.int64) for k in range(1, self.max_size + 1)}
+        self.scores = {k: np.zeros(0, dtype=np.float64) for k in range(1, self.max_size + 1)}
+        self._cache: Dict[Any, Any] = {}
+
+    def __len__(self) -> int:
+        return sum(self._counts)
+
+    def _slot(self, key: Hashable, row: Sequence[Any], score: float) -> int:
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = len(self._rows)
+            self._rows.append(row)
+            self._counts.append(0)
+            self._raw = np.append(self._raw, _raw_value(row))
+            self._score = np.append(self._score, score)
+        elif not self._counts[slot]:
+            # Not held since the last catalog refresh, so the stored row may be stale.
+            self._rows[slot] = row
+            self._raw[slot] = _raw_value(row)
+            self._score[slot] = score
+        return slot
+
+    def _lower(self, size: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if size == 0:
+            return np.zeros((1, 0), dtype=np.int32), np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.float64)
+        return self.combos[size], self.totals[size], self.scores[size]
+
+    def _extend(self, slot: int, copies: int) -> Dict[int, Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """Combinations holding exactly `copies` copies of `slot`, built from the current ones without it."""
+        added = {}
+        for size in range(self.max_size, copies - 1, -1):
+            combos, totals, scores = self._lower(size - copies)
+            if combos.shape[1]:
+                keep = ~np.any(combos == slot, axis=1)
+                combos, totals, scores = combos[keep], totals[keep], scores[keep]
+            if not len(combos):
+                continue
+            fill = np.full((len(combos), copies), slot, dtype=np.int32)
+            added[size] = (
+                np.sort(np.hstack([combos, fill]), axis=1),
+                totals + copies * self._raw[slot],
+                scores + copies * self._score[slot],
+            )
+        return added
+
+    def add(self, key: Hashable, row: Sequence[Any], score: float) -> None:
+        slot = self._slot(key, row, score)
+        self._counts[slot] += 1
+        for size, (combos, totals, scores) in self._extend(slot, self._counts[slot]).items():
+            order = np.argsort(totals, kind="stable")
+            combos, totals, scores = combos[order], totals[order], scores[order]
+            at = np.searchsorted(self.totals[size], totals, side="right")
+            self.combos[size] = np.insert(self.combos[size], at, combos, axis=0)
+            self.totals[size] = np.insert(self.totals[size], at, totals)
+            self.scores[size] = np.insert(self.scores[size], at, scores)
+        self._changed()
+
+    def remove(self, key: Hashable) -> None:
+        slot = self._slots.get(key)
+        if slot is None or not self._counts[slot]:
+            return
+        copies = self._counts[slot]
+        for size in self.combos:
+            keep = np.count_nonzero(self.combos[size] == slot, axis=1) != copies
+            self.combos[size] = self.combos[size][keep]
+            self.totals[size] = self.totals[size][keep]
+            self.scores[size] = self.scores[size][keep]
+        self._counts[slot] -= 1
+        self._changed()
+
+    def _rebuild(self) -> None:
+        counts = self._counts
+        self._clear()
+        self._counts = [0] * len(counts)
+        # The largest size is only ever read at the end, so its pieces are joined once.
+        pieces = []
+        for slot, count in enumerate(counts):
+            for copies in range(1, count + 1):
+                for size, (combos, totals, scores) in self._extend(slot, copies).items():
+                    if size == self.max_size:
+                        pieces.append((combos, totals, scores))
+                        continue
+                    self.combos[size] = np.vstack([self.combos[size], combos])
+                    self.totals[size] = np.append(self.totals[size], totals)
+                    self.scores[size] = np.append(self.scores[size], scores)
+            self._counts[slot] = count
+        if pieces:
+            self.combos[self.max_size] = np.vstack([combos for combos, _, _ in pieces])
+            self.totals[self.max_size] = np.concatenate([totals for _, totals, _ in pieces])
+            self.scores[self.max_size] = np.concatenate([scores for _, _, scores in pieces])
+        self._resort()
+
+    def _reprice(self) -> None:
+        for size, combos in self.combos.items():
+            self.totals[size] = self._raw[combos].sum(axis=1)
+            self.scores[size] = self._score[combos].sum(axis=1)
+        self._resort()
+
+    def _resort(self) -> None:
+        for size in self.combos:
+            order = np.argsort(self.totals[size], kind="stable")
+            self.combos[size] = self.combos[size][order]
+            self.totals[size] = self.totals[size][order]
+            self.scores[size] = self.scores[size][order]
+        self._changed()
+
+    def _changed(self) -> None:
+        self.revision += 1
+        self._cache = {}
+
+    @classmethod
+    def of(cls, items: Sequence[Sequence[Any]], max_size: int, scores: Optional[Sequence[float]] = None) -> "CombinationIndex":
+        """
+        Index over a sort_items list; items() and positions() then refer to `items` as given,
+        since copies of a row sit next to each other. `scores` are the items' scores, if wanted.
+        """
+        index = cls(max_size)
+        keys: Dict[Tuple[Any, ...], int] = {}
+        index.sync([(keys.setdefault(tuple(item), len(keys)), item) for item in items])
+        if scores is not None and len(items):
+            first = np.cumsum([0] + index._counts[:-1])
+            index._score = np.asarray(scores, dtype=np.float64)[first]
+            index._reprice()
+        return index
+
+    def sync(self, entries: Iterable[Tuple[Hashable, Sequence[Any]]], score_table: Any = None) -> None:
+        """
+        Brings the index in line with `entries`, one (item id, catalog row) pair per copy held.
+        `score_table` is the algorithm.ScoreTable of the catalog the rows come from, without one
+        the score sums stay zero.
+        """
+        entries = list(entries)
+        wanted = Counter(key for key, _ in entries)
+        rows = dict(entries)
+        score_table = score_table or _Unscored()
+
+        if score_table.key != self.version:
+            for key, slot in self._slots.items():
+                row = rows.get(key, self._rows[slot])
+                self._rows[slot] = row
+                self._raw[slot] = _raw_value(row)
+                self._score[slot] = score_table.score(row)
+            self.version = score_table.key
+            self._reprice()
+
+        held = Counter({key: self._counts[slot] for key, slot in self._slots.items() if self._counts[slot]})
+        for key, copies in (held - wanted).items():
+            for _ in range(copies):
+                self.remove(key)
+
+        missing = wanted - held
+        if sum(missing.values()) > _REBUILD_AFTER:
+            for key, copies in missing.items():
+                slot = self._slot(key, rows[key], score_table.score(rows[key]))
+                self._counts[slot] += copies
+            self._rebuild()
+        else:
+            for key, copies in missing.items():
+                for _ in range(copies):
+                    self.add(key, rows[key], score_table.score(rows[key]))
+
+    def needs_sync(self, entries: Iterable[Tuple[Hashable, Sequence[Any]]], score_table: Any = None) -> bool:
+        """Whether sync() with these arguments would change anything."""
+        if (score_table or _Unscored()).key != self.version:
+            return True
+        held = Counter({key: self._counts[slot] for key, slot in self._slots.items() if self._counts[slot]})
+        return Counter(key for key, _ in entries) != held
+
+    def copy(self) -> "CombinationIndex":
+        """
+        Copy that can be synced without touching this one. The combination arrays are shared, every
+        change replaces them rather than writing into them.
+        """
+        index = CombinationIndex.__new__(CombinationIndex)
+        index.__dict__.update(self.__dict__)
+        index._slots = dict(self._slots)
+        index._rows = list(self._rows)
+        index._counts = list(self._counts)
+        index._raw = self._raw.copy()
+        index._score = self._score.copy()
+        index.combos, index.totals, index.scores = dict(self.combos), dict(self.totals), dict(self.scores)
+        index._cache = {}
+        return index
+
+    def synced(self, entries: Iterable[Tuple[Hashable, Sequence[Any]]], score_table: Any = None) -> "CombinationIndex":
+        """
+        sync() applied to a copy, or this index when nothing changed. Searches still reading this
+        index from another thread never see it half way through an update.
+        """
+        entries = list(entries)
+        if not self.needs_sync(entries, score_table):
+            return self
+        index = self.copy()
+        index.sync(entries, score_table)
+        return index
+
+    def items(self) -> List[Sequence[Any]]:
+        """Catalog rows of every copy we hold, the order positions() refers to."""
+        if "items" not in self._cache:
+            self._cache["items"] = [row for row, count in zip(self._rows, self._counts) for _ in range(count)]
+        return self._cache["items"]
+
+    def select(self, size: int, min_total: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """positions() of the combinations worth at least `min_total`, with their totals."""
+        start = np.searchsorted(self.totals[size], min_total, side="left")
+        return self.positions(size)[start:], self.totals[size][start:]
+
+    def promising(self, size: int, min_total: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Like select(), but ordered by score per raw value, lowest first: the combinations that
+        cost us the least score for what they are worth, where good trades tend to be.
+        """
+        key = ("promising", size)
+        if key not in self._cache:
+            totals = self.totals[size]
+            ratio = np.divide(self.scores[size], totals, out=np.full(len(totals), np.inf), where=totals > 0)
+            self._cache[key] = np.argsort(ratio, kind="stable")
+        order = self._cache[key]
+        order = order[self.totals[size][order] >= min_total]
+        return self.positions(size)[order], self.totals[size][order]
+
+    def positions(self, size: int, min_total: int = 0) -> np.ndarray:
+        """(m, size) positions into items() of every combination worth at least `min_total`, by total."""
+        key = ("positions", size)
+        if key not in self._cache:
+            base = (np.cumsum([0] + self._counts[:-1]) if self._counts else np.zeros(0)).astype(np.int32)
+            combos = self.combos[size]
+            rank = np.zeros_like(combos)
+            for column in range(1, size):
+                same = combos[:, column] == combos[:, column - 1]
+                rank[:, column] = np.where(same, rank[:, column - 1] + 1, 0)
+            self._cache[key] = base[combos] + rank
+        start = np.searchsorted(self.totals[size], min_total, side="left")
+        return self._cache[key][start:]
+
+
+def window_size(lo: np.ndarray, hi: np.ndarray, totals: np.ndarray) -> int:
+    """Number of pairs window_join would produce."""
+    counts = np.searchsorted(totals, hi, side="right") - np.searchsorted(totals, lo, side="left")
+    return int(np.maximum(counts, 0).sum())
+
+
+def window_join(lo: np.ndarray, hi: np.ndarray, totals: np.ndarray, limit: int) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Pairs every row g of lo/hi with the rows of `totals` (sorted ascending) whose total lies in
+    [lo[g], hi[g]], found by bisection. Yields (g, row) index arrays of at most `limit` pairs at
+    a time, ordered by g and then by total.
+    """
+    start = np.searchsorted(totals, lo, side="left")
+    counts = np.maximum(np.searchsorted(totals, hi, side="right") - start, 0)
+    ends = np.cumsum(counts)
+    total = int(ends[-1]) if len(ends) else 0
+    for first in range(0, total, limit):
+        pair = np.arange(first, min(first + limit, total))
+        g = np.searchsorted(ends, pair, side="right")
+        yield g, start[g] + pair - (ends[g] - counts[g])
@@ -0,0 +1,151 @@
+import numpy as np
+from dataclasses import dataclass
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+
+class Thresholds(NamedTuple):
+    value_only: bool
+    bulk_penalty_rate: float
+    upgrade_penalty_multiplier: float
+    max_giving_value_when_upgrading: float
+    min_receiving_value_when_downgrading: float
+    max_edge_value: float
+    max_item_ratio_upgrade: float
+    min_item_ratio_upgrade: float
+
+
+@dataclass
+class ItemTable:
+    """
+    Per-search item matrix. Row `i` describes one catalog row taking part in the search,
+    the extra last row is an all-zero sentinel used to pad index arrays of shorter combinations.
+    """
+    matrix: np.ndarray   # (n + 1, 6) int64: value, rap, demand, rare, projected, original_price
+    raw: np.ndarray      # value if available else rap
+    worth: np.ndarray    # (value + rap) / 2 if available else rap, used by the item ratio check
+    score: np.ndarray    # item_score of every row
+
+    VALUE = 0
+    RAP = 1
+    DEMAND = 2
+    RARE = 3
+    PROJECTED = 4
+    ORIGINAL_PRICE = 5
+
+    @classmethod
+    def from_columns(cls, matrix: np.ndarray, score: Sequence[float]) -> "ItemTable":
+        matrix = np.vstack([np.asarray(matrix, dtype=np.int64).reshape(-1, 6), np.zeros((1, 6), dtype=np.int64)])
+        value = matrix[:, cls.VALUE]
+        rap = matrix[:, cls.RAP]
+        has_value = value != -1
+        raw = np.where(has_value, value, rap)
+        worth = np.where(has_value, (value + rap) / 2, rap.astype(np.float64))
+        score = np.append(np.asarray(score, dtype=np.float64), 0.0)
+        return cls(matrix=matrix, raw=raw, worth=worth, score=score)
+
+    @property
+    def sentinel(self) -> int:
+        return len(self.score) - 1
+
+    @property
+    def value(self) -> np.ndarray:
+        return self.matrix[:, self.VALUE]
+
+    def pack(self, combos: Sequence[Sequence[int]], width: Optional[int] = None) -> np.ndarray:
+        """Turns a list of index tuples into a padded (len(combos), width) index array."""
+        width = width or max((len(combo) for combo in combos), default=1)
+        padding = (self.sentinel,) * width
+        return np.array([tuple(combo) + padding[len(combo):] for combo in combos], dtype=np.int32).reshape(-1, width)
+
+
+class BatchResult(NamedTuple):
+    decision: np.ndarray
+    giving_score: np.ndarray
+    receiving_score: np.ndarray
+    giving_raw: np.ndarray
+    receiving_raw: np.ndarray
+
+
+def _ordered_sum(column: np.ndarray, idx: np.ndarray) -> np.ndarray:
+    # Column by column so float totals are accumulated in the same order as Python's sum().
+    total = column[idx[:, 0]]
+    for k in range(1, idx.shape[1]):
+        total = total + column[idx[:, k]]
+    return total
+
+
+def _valid_ratio(table: ItemTable, idx: np.ndarray, mask: np.ndarray, max_ratio: float, min_ratio: float) -> np.ndarray:
+    worth = table.worth[idx]
+    total = _ordered_sum(table.worth, idx)[:, None]
+    within = (worth <= total * max_ratio) & (worth >= total * min_ratio)
+    return (total[:, 0] == 0) | np.all(within | ~mask, axis=1)
+
+
+def evaluate(table: ItemTable, giving: np.ndarray, receiving: np.ndarray, thresholds: Thresholds, allow_edge: bool = False) -> BatchResult:
+    """
+    Array version of algorithm.evaluate_trade for a batch of candidates.
+    `giving` and `receiving` are padded index arrays into `table`; scores are returned unrounded.
+    """
+    sentinel = table.sentinel
+    giving_mask = giving != sentinel
+    receiving_mask = receiving != sentinel
+    giving_count = giving_mask.sum(axis=1)
+    receiving_count = receiving_mask.sum(axis=1)
+
+    giving_score = _ordered_sum(table.score, giving)
+    receiving_score = _ordered_sum(table.score, receiving)
+    giving_score = giving_score * np.where(giving_count > 1, 1 - thresholds.bulk_penalty_rate * (giving_count - 1), 1.0)
+    receiving_score = receiving_score * np.where(receiving_count > 1, 1 - thresholds.bulk_penalty_rate * (receiving_count - 1), 1.0)
+    giving_score = np.where(giving_count < receiving_count, giving_score * thresholds.upgrade_penalty_multiplier, giving_score)
+    receiving_score = np.where(receiving_count < giving_count, receiving_score * thresholds.upgrade_penalty_multiplier, receiving_score)
+
+    giving_raw = _ordered_sum(table.raw, giving)
+    receiving_raw = _ordered_sum(table.raw, receiving)
+
+    floor = np.iinfo(np.int64).min
+    max_giving_value = np.where(giving_mask, table.raw[giving], floor).max(axis=1)
+    max_receiving_value = np.where(receiving_mask, table.raw[receiving], floor).max(axis=1)
+    downgrading = max_giving_value > max_receiving_value
+
+    upgrade_ok = giving_raw < receiving_raw * thresholds.max_giving_value_when_upgrading
+    if allow_edge:
+        upgrade_ok &= receiving_raw < giving_raw
+    upgrade_ok &= _valid_ratio(table, giving, giving_mask, thresholds.max_item_ratio_upgrade, thresholds.min_item_ratio_upgrade)
+
+    downgrade_ok = (receiving_raw > giving_raw * thresholds.min_receiving_value_when_downgrading) & (receiving_raw > giving_raw)
+    downgrade_ok &= _valid_ratio(table, receiving, receiving_mask, thresholds.max_item_ratio_upgrade, thresholds.min_item_ratio_upgrade)
+
+    decision = np.where(downgrading, downgrade_ok, upgrade_ok)
+    decision &= ~(giving_raw > receiving_raw * thresholds.max_edge_value)
+    if allow_edge:
+        decision &= ~(receiving_raw > giving_raw * thresholds.max_edge_value)
+    decision &= receiving_score > giving_score
+    decision &= (giving_count > 0) & (receiving_count > 0)
+    if thresholds.value_only:
+        decision &= ~np.any((table.value[receiving] <= 0) & receiving_mask, axis=1)
+
+    return BatchResult(decision, giving_score, receiving_score, giving_raw, receiving_raw)
+
+
+def top_candidates(result: BatchResult, limit: int) -> List[Tuple[int, float, float]]:
+    """
+    Returns (index, rounded giving score, rounded receiving score) for the accepted candidates
+    that can still rank among the `limit` best of this batch. Scores are rounded with Python's
+    round() so profit scores and ties come out exactly like evaluate_trade's.
+    """
+    accepted = np.flatnonzero(result.decision)
+    if not len(accepted):
+        return []
+    profit = result.receiving_score[accepted] - result.giving_score[accepted]
+    if len(accepted) > limit:
+        cutoff = np.partition(profit, len(profit) - limit)[len(profit) - limit]
+        # Rounding both scores to 2 decimals moves the profit by at most 0.01.
+        accepted = accepted[profit >= cutoff - 0.02]
+
+    candidates = []
+    for index in accepted.tolist():
+        giving_score = round(float(result.giving_score[index]), 2)
+        receiving_score = round(float(result.receiving_score[index]), 2)
+        if receiving_score - giving_score > 0:
+            candidates.append((index, giving_score, receiving_score))
+    return candidates
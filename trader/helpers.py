@@ -1,4 +1,3 @@
-import aiohttp
 import re
 import json
 from dataclasses import dataclass, field
@@ -8,6 +7,7 @@ from typing import Dict, List, Optional, Tuple, Any, Literal, cast, Callable, Co
 from trader.models.item import HistoryData, SaleData, OwnershipData, HoardData, BCCopyData, CopyData, ValueChange
 from trader.models.user import ScannedPlayerAsset, WishList, NFTList, AskingList, Asking, ChartData
 from trader.data_types import item_types, user_types
+from trader import sessions
 
 def pass_session(func: Callable[..., Coroutine[Any, Any, Any]]) -> Callable[..., Coroutine[Any, Any, Any]]:
     @wraps(func)
@@ -15,11 +15,17 @@ def pass_session(func: Callable[..., Coroutine[Any, Any, Any]]) -> Callable[...,
         if 'session' in kwargs and kwargs['session'] is not None:
             return await func(*args, **kwargs)
         
-        async with aiohttp.ClientSession() as session:
+        async with sessions.shared() as session:
             kwargs['session'] = session
             return await func(*args, **kwargs)
     return wrapper
 
+_JSON_DECODER = json.JSONDecoder()
+# A var/let/const keyword right before the end of the searched text, i.e. before a variable name.
+_DECLARATION_END = re.compile(r'\b(?:var|let|const)\s+$')
+# Opening and closing script tags, any case like in extract().
+_SCRIPT_TAG = re.compile(r'<(/?)script', re.IGNORECASE)
+
 @dataclass
 class JSVariable:
     name: str
@@ -36,6 +42,50 @@ class JSVariableExtractor:
             self._extract_from_script(script)
         return self.variables
 
+    def extract_named(self, *names: str) -> Dict[str, JSVariable]:
+        """
+        extract() for only the given variable names. Each declaration is found by searching for
+        its name, and an object or array value is decoded in one pass by the JSON decoder instead
+        of being scanned character by character. Falls back to extract() when a value isn't plain JSON.
+        """
+        for name in names:
+            found, variable = self._extract_named(name)
+            if found and variable is None:
+                extracted = JSVariableExtractor(self.html_text).extract()
+                self.variables.update({wanted: extracted[wanted] for wanted in names if wanted in extracted})
+                break
+            if variable is not None:
+                self.variables[name] = variable
+        return {name: self.variables[name] for name in names if name in self.variables}
+
+    def _extract_named(self, name: str) -> Tuple[bool, Optional[JSVariable]]:
+        # (whether name is declared at all, its value when that could be decoded here)
+        html = self.html_text
+        # Searching for the name itself is much faster than for the declaration around it, which
+        # is checked for each hit instead. Later declarations win, like in extract().
+        match = None
+        for hit in re.finditer(re.escape(name) + r'\s*=\s*', html):
+            if _DECLARATION_END.search(html, max(0, hit.start() - 32), hit.start()):
+                match = hit
+        if match is None:
+            return False, None
+
+        start_index: int = match.end()
+        last_tag = None
+        for last_tag in _SCRIPT_TAG.finditer(html, 0, start_index):
+            pass
+        in_script = last_tag is not None and not last_tag.group(1)
+        if not in_script or html[start_index:start_index + 1] not in ('{', '['):
+            return True, None
+        try:
+            value, end_index = _JSON_DECODER.raw_decode(html, start_index)
+        except ValueError:
+            return True, None
+        # Anything but a semicolon after the literal means it's part of a larger expression.
+        if not html[end_index:end_index + 256].lstrip().startswith(';'):
+            return True, None
+        return True, JSVariable(name=name, value=value)
+
     def _extract_script_blocks(self, html: str) -> List[str]:
         pattern = re.compile(r"<script[^>]*>(.*?)</script>", re.DOTALL | re.IGNORECASE)
         return [m.strip() for m in pattern.findall(html)]
@@ -0,0 +1,181 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Priority classes, lower goes first when several requests wait on the same host.
+URGENT = 0       # accepting and countering inbound trades
+NORMAL = 1
+BACKGROUND = 2   # ad counts and other lookups nothing waits on
+
+PRIORITY: contextvars.ContextVar[int] = contextvars.ContextVar("priority", default=NORMAL)
+
+# Requests per second and burst per host, overridden by the "rate_limits" block of config.json.
+# Hosts not listed here aren't limited.
+LIMITS = {
+    "www.rolimons.com": {"per_second": 1 / 3, "burst": 1},
+    "api.rolimons.com": {"per_second": 0.5, "burst": 2},
+    "trades.roblox.com": {"per_second": 1, "burst": 5},
+    "inventory.roblox.com": {"per_second": 1, "burst": 5},
+    "users.roblox.com": {"per_second": 1, "burst": 5},
+    "auth.roblox.com": {"per_second": 0.5, "burst": 2},
+}
+# Seconds a host is left alone after it answers 429 without a Retry-After header.
+COOLDOWN = 30
+
+
+@contextmanager
+def priority(level: int) -> Iterator[None]:
+    """Requests made inside the block, awaited calls included, wait in the `level` priority class."""
+    token = PRIORITY.set(level)
+    try:
+        yield
+    finally:
+        PRIORITY.reset(token)
+
+
+class TokenBucket:
+    """
+    Hands out `per_second` tokens a second, saving up to `burst` of them. Waiters are served by
+    priority and then in arrival order. A per_second of 0 or less never makes anyone wait.
+    """
+    def __init__(self, per_second: float, burst: float = 1, clock: Callable[[], float] = time.monotonic) -> None:
+        self.per_second = per_second
+        self.burst = max(1, burst)
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+        self.paused_until = 0.0
+        self.granted = 0
+        self.throttled = 0
+        self.waited = 0.0
+        self.max_wait = 0.0
+        self._queue: List[tuple] = []
+        self._order = itertools.count()
+        self._condition: Optional[asyncio.Condition] = None
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    def _until_token(self) -> float:
+        now = self.clock()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.tokens = min(self.burst, self.tokens + max(0.0, now - self.updated) * self.per_second)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.per_second
+
+    async def acquire(self, level: Optional[int] = None) -> None:
+        if self.per_second <= 0:
+            self.granted += 1
+            return
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        ticket = (PRIORITY.get() if level is None else level, next(self._order))
+        started = self.clock()
+        async with self._condition:
+            heapq.heappush(self._queue, ticket)
+            # Someone less urgent may be waiting for the next token in our place.
+            self._condition.notify_all()
+            try:
+                while True:
+                    if self._queue[0] == ticket:
+                        wait = self._until_token()
+                        if wait <= 0:
+                            break
+                        try:
+                            await asyncio.wait_for(self._condition.wait(), wait)
+                        except asyncio.TimeoutError:
+                            pass
+                    else:
+                        await self._condition.wait()
+                heapq.heappop(self._queue)
+                self.tokens -= 1
+            except BaseException:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                raise
+            finally:
+                self._condition.notify_all()
+
+        waited = self.clock() - started
+        self.granted += 1
+        self.waited += waited
+        self.max_wait = max(self.max_wait, waited)
+
+    def pause(self, seconds: float) -> None:
+        """No tokens for `seconds`, with nothing saved up meanwhile."""
+        self.throttled += 1
+        self.paused_until = max(self.paused_until, self.clock() + seconds)
+        self.tokens = 0
+        self.updated = self.paused_until
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "per_second": self.per_second,
+            "granted": self.granted,
+            "queued": self.queued,
+            "throttled": self.throttled,
+            "average_wait": self.waited / self.granted if self.granted else 0.0,
+            "max_wait": self.max_wait,
+        }
+
+
+class RateLimiter:
+    """A TokenBucket per host, shared by every account so together they stay within each API's allowance."""
+    def __init__(self, limits: Optional[Dict[str, Dict[str, float]]] = None, cooldown: float = COOLDOWN) -> None:
+        self.cooldown = cooldown
+        self.buckets = {
+            host: TokenBucket(limit["per_second"], limit.get("burst", 1))
+            for host, limit in (LIMITS if limits is None else limits).items()
+        }
+
+    async def acquire(self, host: str, level: Optional[int] = None) -> None:
+        bucket = self.buckets.get(host)
+        if bucket is not None:
+            await bucket.acquire(level)
+
+    def rate_limited(self, host: str, retry_after: Optional[str] = None) -> None:
+        """Backs off `host` after a 429, for Retry-After seconds when the response says."""
+        bucket = self.buckets.get(host)
+        if bucket is None:
+            return
+        try:
+            seconds = float(retry_after) if retry_after else self.cooldown
+        except ValueError:
+            seconds = self.cooldown
+        bucket.pause(seconds)
+        logging.warning(f"🚦 {host} answered 429, holding its requests for {seconds:g}s.")
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {host: bucket.stats() for host, bucket in self.buckets.items()}
+
+    async def report(self, interval: float) -> None:
+        """Logs how busy every host is, every `interval` seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            for host, stats in self.stats().items():
+                if stats["granted"] or stats["queued"]:
+                    logging.info(
+                        f"🚦 {host}: {stats['granted']} requests, {stats['queued']} waiting, "
+                        f"{stats['throttled']} 429s, wait avg {stats['average_wait']:.2f}s max {stats['max_wait']:.2f}s."
+                    )
+
+
+limiter = RateLimiter()
+
+
+def configure(settings: Optional[Dict[str, Any]] = None) -> RateLimiter:
+    """Rebuilds the shared limiter from the "rate_limits" config block, call it before the first request."""
+    global limiter
+    settings = settings or {}
+    limits = {host: dict(limit) for host, limit in LIMITS.items()}
+    for host, limit in settings.get("hosts", {}).items():
+        limits.setdefault(host, {}).update(limit)
+    limiter = RateLimiter(limits, settings.get("cooldown", COOLDOWN))
+    return limiter
@@ -1,24 +1,81 @@
 import aiohttp
+import aiofiles
 from collections import deque
 import asyncio
+import json
 import logging
+import os
 import time
 from typing import Dict, Union, Optional
 
 from .models import item
 from .data_types import item_types
 from .helpers import JSVariableExtractor, pass_session
+from . import cache
 from . import errors
+from . import ratelimit
+from . import sessions
 from . import trades
 
 # --- GLOBAL CACHE ---
-# Stores {user_id: (timestamp, ad_count)}
-AD_COUNT_CACHE = {}
+# Ad counts by user id, shared by every account and saved to AD_COUNT_FILE so a restart starts warm.
+# Stored with wall clock times, which stay meaningful across restarts.
 CACHE_TTL = 600  # Keep ad counts for 10 minutes
+AD_COUNT_CACHE_SIZE = 5000
+AD_COUNT_FILE = "ad_counts.json"
+AD_COUNT_CACHE = cache.LRUCache(AD_COUNT_CACHE_SIZE, CACHE_TTL, clock=time.time)
+AD_COUNT_LOOKUPS = cache.SingleFlight()
 # --------------------
 
+def configure_ad_counts(settings=None):
+    """Sets up AD_COUNT_CACHE from the "ad_count_cache" config block and loads what the last run saved."""
+    global AD_COUNT_CACHE, AD_COUNT_FILE
+    settings = settings or {}
+    AD_COUNT_FILE = settings.get("path", AD_COUNT_FILE)
+    AD_COUNT_CACHE = cache.LRUCache(settings.get("max_size", AD_COUNT_CACHE_SIZE), settings.get("ttl", CACHE_TTL), clock=time.time)
+    try:
+        with open(AD_COUNT_FILE, encoding="utf-8") as f:
+            AD_COUNT_CACHE.restore((int(user_id), stored_at, count) for user_id, stored_at, count in json.load(f))
+        logging.info(f"✅ Loaded {len(AD_COUNT_CACHE)} cached ad counts.")
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logging.warning(f"⚠️ Failed to load cached ad counts: {e}")
+
+async def save_ad_counts():
+    # Written aside and swapped in, so a crash mid-write never leaves a broken file behind.
+    temporary = f"{AD_COUNT_FILE}.tmp"
+    async with aiofiles.open(temporary, "w", encoding="utf-8") as f:
+        await f.write(json.dumps(AD_COUNT_CACHE.snapshot()))
+    os.replace(temporary, AD_COUNT_FILE)
+
+async def persist_ad_counts(interval=60):
+    """Saves the ad counts every `interval` seconds when there were new lookups."""
+    saved_misses = AD_COUNT_CACHE.misses
+    while True:
+        await asyncio.sleep(interval)
+        if AD_COUNT_CACHE.misses == saved_misses:
+            continue
+        saved_misses = AD_COUNT_CACHE.misses
+        try:
+            await save_ad_counts()
+            stats = ad_count_stats()
+            logging.info(f"💾 Saved {stats['entries']} ad counts, {stats['hit_rate']:.0%} of lookups were served from cache.")
+        except Exception as e:
+            logging.error(f"❌ Failed to save cached ad counts: {e}")
+
+def ad_count_stats():
+    lookups = AD_COUNT_CACHE.hits + AD_COUNT_CACHE.misses
+    return {
+        "entries": len(AD_COUNT_CACHE),
+        "hits": AD_COUNT_CACHE.hits,
+        "misses": AD_COUNT_CACHE.misses,
+        "hit_rate": AD_COUNT_CACHE.hits / lookups if lookups else 0.0,
+        "coalesced": AD_COUNT_LOOKUPS.joined,
+    }
+
 async def post_ad(roli_verification, player_id, offer_item_ids, request_item_ids, request_tags):
-    async with aiohttp.ClientSession() as session:
+    async with sessions.shared() as session:
         async with session.post("https://api.rolimons.com/tradeads/v1/createad", json={"player_id": player_id, "offer_item_ids": offer_item_ids, "request_item_ids": request_item_ids, "request_tags": request_tags}, cookies={"_RoliVerification": roli_verification}) as response:
             return response.status == 201
 
@@ -32,7 +89,7 @@ async def generic_item_info(session: Optional[aiohttp.ClientSession] = None) ->
         if response.status == 200:
             response_text = await response.text()
             extractor = JSVariableExtractor(response_text)
-            extracted_variables = extractor.extract()
+            extracted_variables = extractor.extract_named(item.BASE_GENERIC_ITEM_VAR_NAME)
 
             if item.BASE_GENERIC_ITEM_VAR_NAME not in extracted_variables:
                 raise errors.invalid_cookie(f"Could not find '{item.BASE_GENERIC_ITEM_VAR_NAME}' variable on Rolimon's page.")
@@ -110,48 +167,44 @@ async def get_player_ad_count(user_id):
     Fetches the user's Rolimons profile to get their current active trade ad count.
     - Returns 0 if user not found (inexperienced).
     - Returns 0 if 429/Error (fail-open to allow trading).
-    - Includes caching and throttling.
+    - Includes caching; requests are paced by the www.rolimons.com rate limit.
     """
-    current_time = time.time()
-    
     # 1. Check Cache
-    if user_id in AD_COUNT_CACHE:
-        timestamp, count = AD_COUNT_CACHE[user_id]
-        if current_time - timestamp < CACHE_TTL:
-            return count
+    count = AD_COUNT_CACHE.get(user_id, cache.MISSING)
+    if count is not cache.MISSING:
+        return count
+
+    # 2. Fetch from API, once for everyone asking about this user right now
+    return await AD_COUNT_LOOKUPS.run(user_id, lambda: fetch_player_ad_count(user_id))
 
-    # 2. Fetch from API
+async def fetch_player_ad_count(user_id):
     url = f"https://www.rolimons.com/player/{user_id}"
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                
-                # CRITICAL: Always sleep after a request to prevent bursting
-                await asyncio.sleep(3.0) 
-
+        # Ad counts wait behind anything more pressing on the same host.
+        with ratelimit.priority(ratelimit.BACKGROUND):
+            async with sessions.get().get(url) as response:
                 if response.status == 200:
                     response_text = await response.text()
                     extractor = JSVariableExtractor(response_text)
-                    extracted_variables = extractor.extract()
+                    extracted_variables = extractor.extract_named("player_details_data")
                     
                     if "player_details_data" in extracted_variables:
                         data = extracted_variables["player_details_data"].value
                         count = data.get("trade_ad_count", 0)
                         
                         # Update Cache
-                        AD_COUNT_CACHE[user_id] = (current_time, count)
+                        AD_COUNT_CACHE.put(user_id, count)
                         return count
                     else:
                         # CASE: User exists on Roblox but has no Rolimons data/profile
                         # This implies they are inexperienced/new to trading.
                         logging.info(f"ℹ️ User {user_id} has no Rolimons data. Assuming 0 ads.")
-                        AD_COUNT_CACHE[user_id] = (current_time, 0)
+                        AD_COUNT_CACHE.put(user_id, 0)
                         return 0
 
                 elif response.status == 429:
+                    # The rate limiter holds further Rolimons requests back, the trade logic proceeds meanwhile.
                     logging.warning(f"⚠️ 429 Too Many Requests from Rolimons. Cooling down... (Defaulting to 0 ads for user {user_id})")
-                    # We still sleep to respect the limit, but we allow the trade logic to proceed.
-                    await asyncio.sleep(30) 
                     return 0 
 
     except Exception as e:
@@ -163,41 +216,72 @@ async def get_player_ad_count(user_id):
     return 0
     
 async def track_trade_ads(self):
-    seen_ids = deque(maxlen=500)
+    """
+    Trade ads go through three stages joined by bounded queues: polling recent ads, screening
+    their posters (ad count, then their inventory, fetched ahead into self.inventories) and
+    searching and sending trades. Posters are screened while the previous batch is searched; once
+    the queues are full each stage waits for the next one, so nothing is fetched that won't be used soon.
+    """
+    new_users = asyncio.Queue(maxsize=self.tracker_prefetch)
+    targets = asyncio.Queue(maxsize=self.tracker_prefetch)
     logging.info(f"👀 Trade Ad Tracker started. Filter: Users with <= {self.max_trade_ads} active ads.")
+    await asyncio.gather(
+        poll_trade_ads(self, new_users),
+        *(screen_partners(self, new_users, targets) for _ in range(self.tracker_screeners)),
+        trade_with_targets(self, targets),
+    )
+
+async def poll_trade_ads(self, new_users):
+    seen_ids = deque(maxlen=500)
     while True:
         try:
-            async with aiohttp.ClientSession() as session:
-                while True:
-                    try:
-                        async with session.get("https://api.rolimons.com/tradeads/v1/getrecentads") as response:
-                            if response.status != 200:
-                                await asyncio.sleep(5)
-                                continue
-
-                            json_response = await response.json()
-                            for trade_ad in json_response.get("trade_ads", []):
-                                user_id = trade_ad[2]
-                                if user_id not in seen_ids:
-                                    seen_ids.append(user_id)
-                                    
-                                    # This call is now safe and throttled internally
-                                    logging.info(f"🔍 [Ad Check] Checking ad count for user {user_id}...")
-                                    ad_count = await get_player_ad_count(user_id)
-                                    
-                                    if ad_count > self.max_trade_ads:
-                                        logging.info(f"🚫 [Ad Check] Skipped user {user_id}. Ads: {ad_count} > Limit: {self.max_trade_ads}")
-                                        continue
-                                        
-                                    logging.info(f"✅ [Ad Check] Target found: {user_id} (Ads: {ad_count}). Sending trade.")
-                                    await trades.send_trade(self, user_id)
-                                    
-                                    # Additional small sleep between trade attempts
-                                    await asyncio.sleep(self.sleep_time_trade_send)
-                                    
-                    except aiohttp.ClientError:
-                        break
-
-        except Exception as outer_error:
-            print(f"[tracker] Full session error: {outer_error}")
+            async with sessions.get().get("https://api.rolimons.com/tradeads/v1/getrecentads") as response:
+                json_response = await response.json() if response.status == 200 else None
+            if json_response is None:
+                await asyncio.sleep(5)
+                continue
+
+            for trade_ad in json_response.get("trade_ads", []):
+                user_id = trade_ad[2]
+                if user_id not in seen_ids:
+                    seen_ids.append(user_id)
+                    # Waits here while screening is behind.
+                    await new_users.put(user_id)
+        except Exception as e:
+            logging.error(f"❌ [Ad Check] Failed to fetch recent trade ads: {e}")
             await asyncio.sleep(10)
+
+async def screen_partners(self, new_users, targets):
+    while True:
+        user_id = await new_users.get()
+        try:
+            logging.info(f"🔍 [Ad Check] Checking ad count for user {user_id}...")
+            ad_count = await get_player_ad_count(user_id)
+
+            if ad_count > self.max_trade_ads:
+                logging.info(f"🚫 [Ad Check] Skipped user {user_id}. Ads: {ad_count} > Limit: {self.max_trade_ads}")
+                continue
+
+            # Fetched now so the search finds it cached.
+            await self.inventories.get(self.cookie, user_id)
+            logging.info(f"✅ [Ad Check] Target found: {user_id} (Ads: {ad_count}).")
+            await targets.put(user_id)
+        except Exception as e:
+            logging.error(f"❌ [Ad Check] Failed to screen user {user_id}: {e}")
+        finally:
+            new_users.task_done()
+
+async def trade_with_targets(self, targets):
+    while True:
+        # Every target screened by now is searched in one batch.
+        batch = [await targets.get()]
+        while not targets.empty():
+            batch.append(targets.get_nowait())
+        try:
+            logging.info(f"✉️ [Ad Check] Sending trades to {len(batch)} target(s).")
+            await trades.send_trades(self, batch)
+        except Exception as e:
+            logging.error(f"❌ [Ad Check] Failed to send trades: {e}")
+        finally:
+            for _ in batch:
+                targets.task_done()
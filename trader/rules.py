@@ -0,0 +1,117 @@
+import logging
+from typing import Any, Callable, Dict, FrozenSet, Hashable, Iterable, List, NamedTuple, Optional, Sequence
+
+from .algorithm import ITEM_NAME, ITEM_PROJECTED, ITEM_RAP, ITEM_VALUE
+
+GIVING = "giving"
+RECEIVING = "receiving"
+BOTH = frozenset({GIVING, RECEIVING})
+
+
+class RuleContext(NamedTuple):
+    value_only: bool
+    not_for_trade: FrozenSet[int]
+    not_accepting: FrozenSet[int]
+
+
+class Rule(NamedTuple):
+    """Keeps an item out of trades on `sides` whenever excludes(context, item id, catalog row) holds."""
+    name: str
+    sides: FrozenSet[str]
+    excludes: Callable[[RuleContext, int, Sequence[Any]], bool]
+
+
+class Adjustment(NamedTuple):
+    """Overrides `columns` of the catalog rows `applies` holds for, on the given sides only."""
+    name: str
+    sides: FrozenSet[str]
+    applies: Callable[[Sequence[Any]], bool]
+    columns: Dict[int, Any]
+
+
+# Items with "egg" in their name worth less than this are treated as worthless when we get them.
+EGG_MAX_VALUE = 680
+
+
+def _raw_value(row: Sequence[Any]) -> int:
+    return row[ITEM_VALUE] if row[ITEM_VALUE] != -1 else row[ITEM_RAP]
+
+
+RULES = (
+    # We only give items with a truthy projected flag, but only refuse items flagged 1 from others.
+    Rule("projected", frozenset({GIVING}), lambda context, item_id, row: not row[ITEM_PROJECTED]),
+    Rule("projected", frozenset({RECEIVING}), lambda context, item_id, row: row[ITEM_PROJECTED] == 1),
+    Rule("value_only", BOTH, lambda context, item_id, row: context.value_only and row[ITEM_VALUE] == 1),
+    Rule("not_for_trade", frozenset({GIVING}), lambda context, item_id, row: item_id in context.not_for_trade),
+    Rule("not_accepting", frozenset({RECEIVING}), lambda context, item_id, row: item_id in context.not_accepting),
+)
+
+ADJUSTMENTS = (
+    Adjustment(
+        "egg", frozenset({RECEIVING}),
+        lambda row: "egg" in row[ITEM_NAME].lower() and _raw_value(row) < EGG_MAX_VALUE,
+        {ITEM_RAP: 0, ITEM_VALUE: 0},
+    ),
+)
+
+
+class Eligibility:
+    """
+    RULES and ADJUSTMENTS compiled against one catalog: the rules every item breaks, the items
+    each side may trade and the adjusted rows, so trade code only does dict and set lookups.
+    Built again whenever the catalog changes.
+    """
+    def __init__(
+        self, catalog: Dict[str, Sequence[Any]], settings: dict,
+        not_for_trade: Iterable[int] = (), not_accepting: Iterable[int] = (),
+        version: Optional[Hashable] = None,
+        rules: Sequence[Rule] = RULES, adjustments: Sequence[Adjustment] = ADJUSTMENTS,
+    ) -> None:
+        self.version = version
+        self.context = RuleContext(
+            bool(settings["modes"]["value_only"]),
+            frozenset(int(item_id) for item_id in not_for_trade),
+            frozenset(int(item_id) for item_id in not_accepting),
+        )
+        self.catalog = catalog
+        self._broken: Dict[str, FrozenSet[str]] = {}
+        self._blocked: Dict[str, set] = {GIVING: set(), RECEIVING: set()}
+        self._rows: Dict[str, Dict[str, List[Any]]] = {GIVING: {}, RECEIVING: {}}
+
+        adjusted: Dict[str, int] = {}
+        for item_id, row in catalog.items():
+            broken = [rule for rule in rules if rule.excludes(self.context, int(item_id), row)]
+            if broken:
+                self._broken[item_id] = frozenset(rule.name for rule in broken)
+                for rule in broken:
+                    for side in rule.sides:
+                        self._blocked[side].add(item_id)
+            for adjustment in adjustments:
+                if adjustment.applies(row):
+                    adjusted[adjustment.name] = adjusted.get(adjustment.name, 0) + 1
+                    for side in adjustment.sides:
+                        new_row = list(self._rows[side].get(item_id, row))
+                        for column, value in adjustment.columns.items():
+                            new_row[column] = value
+                        self._rows[side][item_id] = new_row
+
+        for name, count in adjusted.items():
+            logging.info(f"🥚 Applying {name} rule to {count} item(s).")
+
+    def breaks(self, item_id: Any, rule: str) -> bool:
+        """Whether catalog item `item_id` breaks the rule called `rule`."""
+        return rule in self._broken.get(str(item_id), ())
+
+    def row(self, item_id: Any, side: str) -> Optional[Sequence[Any]]:
+        """Catalog row of `item_id` as seen on `side`, adjustments applied, or None if unknown."""
+        item_id = str(item_id)
+        return self._rows[side].get(item_id) or self.catalog.get(item_id)
+
+    def tradable(self, item_id: Any, side: str) -> Optional[Sequence[Any]]:
+        """row(), but None as well when a rule keeps the item off `side`."""
+        if str(item_id) in self._blocked[side]:
+            return None
+        return self.row(item_id, side)
+
+    def adjusted_rows(self) -> List[Sequence[Any]]:
+        return [row for rows in self._rows.values() for row in rows.values()]
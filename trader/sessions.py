@@ -0,0 +1,78 @@
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+import aiohttp
+
+from . import ratelimit
+
+# Connection pool settings, overridden by the "http" block of config.json.
+HTTP = {
+    "limit": 100,               # open connections in total
+    "limit_per_host": 20,       # open connections to any one host
+    "dns_cache_ttl": 300,       # seconds a resolved host is reused
+    "keepalive_timeout": 30,    # seconds an idle connection is kept for the next request
+    "connect_timeout": 10,
+    "read_timeout": 30,
+}
+
+_settings: Dict[str, Any] = dict(HTTP)
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def configure(settings: Optional[Dict[str, Any]] = None) -> None:
+    """Applies `settings` over HTTP for the next session, call it before the first request."""
+    _settings.clear()
+    _settings.update(HTTP, **(settings or {}))
+
+
+async def _rate_limited(request: aiohttp.ClientRequest, handler) -> aiohttp.ClientResponse:
+    # Every request waits its turn in its host's bucket, and a 429 backs the whole host off.
+    host = request.url.host
+    await ratelimit.limiter.acquire(host)
+    response = await handler(request)
+    if response.status == 429:
+        ratelimit.limiter.rate_limited(host, response.headers.get("Retry-After"))
+    return response
+
+
+def get() -> aiohttp.ClientSession:
+    """
+    The session every request goes through, opened on first use from within the event loop.
+    Connections are kept alive per host and reused across calls and accounts; cookies are passed
+    per request and never stored, so accounts sharing it don't see each other's cookies. Requests
+    are paced by ratelimit.limiter.
+    """
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=_settings["limit"],
+            limit_per_host=_settings["limit_per_host"],
+            ttl_dns_cache=_settings["dns_cache_ttl"],
+            keepalive_timeout=_settings["keepalive_timeout"],
+        )
+        # No total timeout: it would count the time a request waits on its host's rate limit.
+        timeout = aiohttp.ClientTimeout(
+            total=None,
+            sock_connect=_settings["connect_timeout"],
+            sock_read=_settings["read_timeout"],
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector, timeout=timeout, cookie_jar=aiohttp.DummyCookieJar(),
+            middlewares=(_rate_limited,)
+        )
+    return _session
+
+
+@asynccontextmanager
+async def shared() -> AsyncIterator[aiohttp.ClientSession]:
+    """`async with` form of get(); the session stays open when the block ends."""
+    yield get()
+
+
+async def close() -> None:
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+        logging.info("🔌 HTTP connection pool closed.")
+    _session = None
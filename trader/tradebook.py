@@ -0,0 +1,86 @@
+from typing import Any, Dict, Hashable, Iterable, NamedTuple, Optional, Tuple
+
+from .rules import GIVING, RECEIVING
+
+
+class TradeRecord(NamedTuple):
+    """What we made of a trade: the item ids on each side, the row versions the verdict used and the verdict."""
+    trade_id: int
+    giving: Tuple[str, ...]
+    receiving: Tuple[str, ...]
+    versions: Tuple[Any, ...]
+    verdict: str
+    catalog_version: Hashable
+
+
+def item_versions(eligibility, giving: Iterable[str], receiving: Iterable[str]) -> Tuple[Any, ...]:
+    """Catalog rows the items are valued by, per side, so a changed value shows up as a changed version."""
+    rows = [eligibility.row(item_id, GIVING) for item_id in giving]
+    rows += [eligibility.row(item_id, RECEIVING) for item_id in receiving]
+    return tuple(None if row is None else tuple(row) for row in rows)
+
+
+def offer_asset_ids(trade_json: dict, user_id: int) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """Asset ids we give and get in a trade's details, limiteds or not."""
+    giving, receiving = (), ()
+    for offer in trade_json.get("offers", []):
+        asset_ids = tuple(str(asset["assetId"]) for asset in offer["userAssets"])
+        if offer["user"]["id"] == user_id:
+            giving = asset_ids
+        else:
+            receiving = asset_ids
+    return giving, receiving
+
+
+class TradeBook:
+    """
+    Trades already looked at, by trade id. A recorded trade only needs another look once the
+    catalog rows of one of its items change, which is checked against the catalog version first
+    and per item only when that moved, so known trades cost no requests while values stand still.
+    """
+    def __init__(self) -> None:
+        self.records: Dict[int, TradeRecord] = {}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __contains__(self, trade_id: int) -> bool:
+        return trade_id in self.records
+
+    def get(self, trade_id: int) -> Optional[TradeRecord]:
+        return self.records.get(trade_id)
+
+    def record(self, trade_id: int, giving: Iterable[Any], receiving: Iterable[Any], verdict: str, eligibility) -> TradeRecord:
+        giving = tuple(str(item_id) for item_id in giving)
+        receiving = tuple(str(item_id) for item_id in receiving)
+        record = TradeRecord(
+            trade_id, giving, receiving,
+            item_versions(eligibility, giving, receiving),
+            verdict, eligibility.version
+        )
+        self.records[trade_id] = record
+        return record
+
+    def discard(self, trade_id: int) -> None:
+        self.records.pop(trade_id, None)
+
+    def needs_review(self, trade_id: int, eligibility) -> bool:
+        """Whether the trade is new, or the value of one of its items changed since its verdict."""
+        record = self.records.get(trade_id)
+        if record is None:
+            return True
+        if record.catalog_version == eligibility.version:
+            return False
+        if item_versions(eligibility, record.giving, record.receiving) != record.versions:
+            return True
+        self.records[trade_id] = record._replace(catalog_version=eligibility.version)
+        return False
+
+    def prune(self, live_trade_ids: Iterable[int]) -> int:
+        """Forgets trades that are no longer listed, returns how many were dropped."""
+        live = set(live_trade_ids)
+        gone = [trade_id for trade_id in self.records if trade_id not in live]
+        for trade_id in gone:
+            del self.records[trade_id]
+        return len(gone)
+
@@ -1,4 +1,3 @@
-import aiohttp
 import asyncio
 import random
 import time
@@ -6,18 +5,17 @@ from datetime import datetime, timezone
 from collections import defaultdict
 
 from . import algorithm
+from . import cache
+from . import combos
 from . import user
 from . import rolimon
+from . import ratelimit
+from . import rules
+from . import sessions
+from . import tradebook
 
 import logging
 
-class IgnoreUnclosedSessionFilter(logging.Filter):
-    def filter(self, record):
-        msg = record.getMessage()
-        if "Unclosed client session" in msg or "Unclosed connector" in msg:
-            return False
-        return True
-
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s │ %(levelname)-8s │ %(message)s",
@@ -25,13 +23,11 @@ logging.basicConfig(
     handlers=[logging.StreamHandler()]
 )
 
-for handler in logging.getLogger().handlers:
-    handler.addFilter(IgnoreUnclosedSessionFilter())
-
 async def check_outbound(self):
     while True:
         next_page_cursor = ""
-        async with aiohttp.ClientSession() as session:
+        listed_trade_ids = []
+        async with sessions.shared() as session:
             while True:
                 try:
                     async with session.get(
@@ -44,13 +40,18 @@ async def check_outbound(self):
                                 logging.info("✅ Roblox cookie authentication has recovered.")
 
                             json_data = await response.json()
+                            eligibility = self.eligibility()
                             for trade in json_data.get("data", []):
+                                listed_trade_ids.append(trade["id"])
+                                # Trades whose items kept their values since the last look keep their verdict.
+                                if not self.outbound_trades.needs_review(trade["id"], eligibility):
+                                    continue
                                 try:
-                                    # --- CHECK AD COUNT (Throttled via rolimon.py) ---
+                                    # --- CHECK AD COUNT (cached, rate limited by ratelimit.py) ---
                                     partner_info = trade['user']
                                     partner_id = partner_info['id']
                                     
-                                    # This call will now sleep for 3s if it hits the API
+                                    # Cache misses wait their turn in the Rolimons token bucket instead of sleeping
                                     ad_count = await rolimon.get_player_ad_count(partner_id)
 
                                     if ad_count > self.max_trade_ads:
@@ -66,13 +67,16 @@ async def check_outbound(self):
                                     if not trade_json:
                                         continue
 
+                                    asset_ids_giver, asset_ids_receiver = tradebook.offer_asset_ids(trade_json, self.user_id)
                                     if not giving_items or not receiving_items:
+                                        self.outbound_trades.record(trade["id"], asset_ids_giver, asset_ids_receiver, "skipped", eligibility)
                                         continue
 
-                                    keep, giving_score, receiving_score = await algorithm.evaluate_trade(giving_items, receiving_items, self.algorithm, allow_edge=True)
-                                    if not keep or any(int(item_id) in self.item_ids_not_for_trade for item_id in item_ids_giver) or any(int(item_id) in self.item_ids_not_accepting for item_id in item_ids_receiver):
+                                    keep, giving_score, receiving_score = await algorithm.evaluate_trade(giving_items, receiving_items, self.algorithm, allow_edge=True, score_table=self.score_table())
+                                    if not keep or any(eligibility.breaks(item_id, "not_for_trade") for item_id in item_ids_giver) or any(eligibility.breaks(item_id, "not_accepting") for item_id in item_ids_receiver):
                                         message, status = await decline(self, trade["id"])
                                         if status == 200:
+                                            self.outbound_trades.discard(trade["id"])
                                             logging.info(f"🚫 Declined losing outbound trade {trade['id']}")
                                             giver_raw_items = next(offer for offer in trade_json["offers"] if offer["user"]["id"] == self.user_id)['userAssets']
                                             receiver_raw_items = next(offer for offer in trade_json["offers"] if offer["user"]["id"] == partner_info['id'])['userAssets']
@@ -82,13 +86,14 @@ async def check_outbound(self):
                                         else:
                                             logging.warning(f"🛑 Failed to decline losing outbound trade {trade['id']}")
                                             await self.send_webhook_notification({"content": f"Failed to decline losing outbound trade. Reason: {message['errors'][0]['message']} Please cancel outbound trade as soon as possible. Giving score: `{giving_score}`, Receiving score: `{receiving_score}`. https://www.roblox.com/trades#{trade['id']}"})
+                                    else:
+                                        self.outbound_trades.record(trade["id"], asset_ids_giver, asset_ids_receiver, "keep", eligibility)
                                 except Exception as e:
                                     logging.error(f"❌ Error processing outbound trade {trade['id']}: {e}")
-                                finally:
-                                    await asyncio.sleep(1) # Small delay between trades
 
                             next_page_cursor = json_data.get("nextPageCursor")
                             if not next_page_cursor:
+                                self.outbound_trades.prune(listed_trade_ids)
                                 break
                         else:
                             if response.status in [401, 403] and getattr(self, 'roblox_cookie_working', True):
@@ -108,9 +113,12 @@ async def check_outbound(self):
                     await asyncio.sleep(10)
                     
 async def check_inbound(self):
+    # Runs as its own task, so this only puts inbound requests (accepts, counters) ahead of the rest.
+    ratelimit.PRIORITY.set(ratelimit.URGENT)
     while True:
         next_page_cursor = ""
-        async with aiohttp.ClientSession() as session:
+        listed_trade_ids = []
+        async with sessions.shared() as session:
             while True:
                 try:
                     async with session.get(
@@ -123,13 +131,18 @@ async def check_inbound(self):
                                 logging.info("✅ Roblox cookie authentication has recovered.")
 
                             json_data = await response.json()
+                            eligibility = self.eligibility()
                             for trade in json_data.get("data", []):
+                                listed_trade_ids.append(trade["id"])
+                                # Pending trades that already got a verdict are only looked at again once their items' values move.
+                                if not self.inbound_trades.needs_review(trade["id"], eligibility):
+                                    continue
                                 try:
-                                    # --- CHECK AD COUNT (Throttled via rolimon.py) ---
+                                    # --- CHECK AD COUNT (cached, rate limited by ratelimit.py) ---
                                     partner_info = trade['user']
                                     partner_id = partner_info['id']
 
-                                    # This call will now sleep for 3s if it hits the API
+                                    # Cache misses wait their turn in the Rolimons token bucket instead of sleeping
                                     ad_count = await rolimon.get_player_ad_count(partner_id)
 
                                     if ad_count > self.max_trade_ads:
@@ -148,12 +161,16 @@ async def check_inbound(self):
                                     giver_raw_items = next(offer for offer in trade_json["offers"] if offer["user"]["id"] == self.user_id)['userAssets']
                                     receiver_raw_items = next(offer for offer in trade_json["offers"] if offer["user"]["id"] == partner_info['id'])['userAssets']
 
-                                    if not giving_items or not receiving_items or any(int(item_id) in self.item_ids_not_for_trade for item_id in item_ids_giver) or any(int(item_id) in self.item_ids_not_accepting for item_id in item_ids_receiver):
+                                    if not giving_items or not receiving_items or any(eligibility.breaks(item_id, "not_for_trade") for item_id in item_ids_giver) or any(eligibility.breaks(item_id, "not_accepting") for item_id in item_ids_receiver):
+                                        asset_ids_giver, asset_ids_receiver = tradebook.offer_asset_ids(trade_json, self.user_id)
+                                        self.inbound_trades.record(trade["id"], asset_ids_giver, asset_ids_receiver, "skipped", eligibility)
                                         continue
 
-                                    keep, giving_score, receiving_score = await algorithm.evaluate_trade(giving_items, receiving_items, self.algorithm, allow_edge=False)
+                                    keep, giving_score, receiving_score = await algorithm.evaluate_trade(giving_items, receiving_items, self.algorithm, allow_edge=False, score_table=self.score_table())
                                     if keep:
                                         if (await self.authenticator_client.accept_trade(TAG=self.cookie[-10:], TRADE_ID=trade["id"])).status == 200:
+                                            self.inbound_trades.discard(trade["id"])
+                                            self.inventories.invalidate(partner_id)
                                             logging.info(f"✅ Successfully accepted inbound trade {trade['id']}")
                                             reason = f"Accepted due to favorable score. Profit Score: `{receiving_score - giving_score:.2f}`."
                                             webhook_payload = await generate_decision_webhook(self, "Accepted", trade['id'], partner_info, giver_raw_items, receiver_raw_items, giving_score, receiving_score, reason)
@@ -177,9 +194,11 @@ async def check_inbound(self):
 
                                         trade_info_dict = None
                                         if can_send_trade:
-                                            trade_info_dict = await generate_trade(self, trade['user']['id'], True)
+                                            trade_info_dict = await generate_counter(self, trade['user']['id'], giving_items, receiving_items)
 
-                                        if trade_info_dict:
+                                        # Any alternative makes for a counter-offer too if Roblox refuses the best one.
+                                        countered = False
+                                        for trade_info_dict in ([trade_info_dict] + trade_info_dict['alternatives']) if trade_info_dict else []:
                                             logging.info(f"✉️ Sending counter trade to user {trade['user']['id']}.")
                                             response_counter = await self.authenticator_client.counter_trade(TAG=self.cookie[-10:], TRADE_DATA=trade_info_dict['trade_data'], TRADE_ID = trade["id"])
 
@@ -196,22 +215,30 @@ async def check_inbound(self):
                                                 counter_reason = f"Sent as a counter-offer. Profit Score: `{trade_info_dict['receiving_score'] - trade_info_dict['giving_score']:.2f}`."
                                                 counter_webhook = await generate_decision_webhook(self, "Countered", counter_trade_id, partner_info, trade_info_dict['giving_items_raw'], trade_info_dict['receiving_items_raw'], trade_info_dict['giving_score'], trade_info_dict['receiving_score'], counter_reason)
                                                 await self.send_webhook_notification(counter_webhook)
-                                                
-                                                continue
+                                                self.inbound_trades.discard(trade["id"])
+                                                countered = True
+                                                break
+                                            logging.warning(f"⚠️ Failed to counter trade {trade['id']}. Response status: {response_counter.status}")
+                                            if response_counter.status == 429:
+                                                break
+                                        if countered:
+                                            continue
                                         
                                         reason_for_decline = f"Declined due to unfavorable score. Profit Score: `{receiving_score - giving_score:.2f}`."
                                         message, status = await decline(self, trade["id"])
                                         if status == 200:
+                                            self.inbound_trades.discard(trade["id"])
                                             logging.info(f"✅ Successfully declined trade {trade['id']}.")
                                             webhook_payload = await generate_decision_webhook(self, "Declined", trade['id'], partner_info, giver_raw_items, receiver_raw_items, giving_score, receiving_score, reason_for_decline)
                                             await self.send_webhook_notification(webhook_payload)
                                         else:
                                             logging.warning(f"⚠️ Failed to decline trade {trade['id']}: {message}")
-                                finally:
-                                    await asyncio.sleep(1) # Small delay between trades
+                                except Exception as e:
+                                    logging.error(f"❌ Error processing inbound trade {trade['id']}: {e}")
 
                             next_page_cursor = json_data.get("nextPageCursor")
                             if not next_page_cursor:
+                                self.inbound_trades.prune(listed_trade_ids)
                                 break
                         else:
                             if response.status in [401, 403] and getattr(self, 'roblox_cookie_working', True):
@@ -231,44 +258,35 @@ async def check_inbound(self):
                     await asyncio.sleep(10)
                     
 async def trade_info(self, trade_id):
+    """
+    Items of a trade's two sides and its details. The details are {} only when the fetch failed;
+    trades we can't evaluate, with robux or non-limited items, come back with their details and no items.
+    """
     giving_items, receiving_items, item_ids_giver, item_ids_receiver = [], [], [], []
 
-    async with aiohttp.ClientSession() as session:
+    async with sessions.shared() as session:
         async with session.get(f"https://trades.roblox.com/v1/trades/{trade_id}", cookies={".ROBLOSECURITY": self.cookie}) as response:
             if response.status == 200:
                 json_response = await response.json()
                 if json_response["offers"][0]["robux"] > 0 or json_response["offers"][1]["robux"] > 0:
-                    return [], [], [], [], {}
+                    return [], [], [], [], json_response
                 giver_index = 0 if json_response["offers"][0]["user"]["id"] == self.user_id else 1
                 receiver_index = 0 if giver_index == 1 else 1
 
+                eligibility = self.eligibility()
                 for item in json_response["offers"][giver_index]["userAssets"]:
                     if str(item["assetId"]) in self.all_limiteds:
                         item_ids_giver.append(str(item["assetId"]))
-                        giving_items.append(self.all_limiteds[str(item["assetId"])])
+                        giving_items.append(eligibility.row(item["assetId"], rules.GIVING))
                     else:
                         return [], [], item_ids_giver, item_ids_receiver, json_response
 
                 for item in json_response["offers"][receiver_index]["userAssets"]:
-                        if str(item["assetId"]) in self.all_limiteds:
-                            item_ids_receiver.append(str(item["assetId"]))
-                            
-                            item_data = self.all_limiteds[str(item["assetId"])]
-                            
-                            item_name = item_data[0]
-                            item_value = item_data[3] if item_data[3] != -1 else item_data[2]
-
-                            if "egg" in item_name.lower() and item_value < 680:
-                                logging.info(f"🥚 Applying egg rule to '{item_name}' (value: {item_value}). Treating as 0 Robux.")
-                                modified_item_data = list(item_data)
-                                modified_item_data[2] = 0
-                                modified_item_data[3] = 0
-                                receiving_items.append(modified_item_data)
-                            else:
-                                receiving_items.append(item_data)
-
-                        else:
-                            return [], [], item_ids_giver, item_ids_receiver, json_response
+                    if str(item["assetId"]) in self.all_limiteds:
+                        item_ids_receiver.append(str(item["assetId"]))
+                        receiving_items.append(eligibility.row(item["assetId"], rules.RECEIVING))
+                    else:
+                        return [], [], item_ids_giver, item_ids_receiver, json_response
 
                 return giving_items, receiving_items, item_ids_giver, item_ids_receiver, json_response
             else:
@@ -276,7 +294,7 @@ async def trade_info(self, trade_id):
                 return [], [], [], [], {}
 
 async def decline(self, trade_id):
-    async with aiohttp.ClientSession() as session:
+    async with sessions.shared() as session:
         async with session.post(f"https://trades.roblox.com/v1/trades/{trade_id}/decline", cookies={".ROBLOSECURITY": self.cookie}, headers={"x-csrf-token": await self.get_xcsrf_token()}) as response:
             json_response = await response.json()
             return json_response, response.status
@@ -302,10 +320,15 @@ async def trades_watcher(self):
                 for trade_id in scraped_trades.get("data", []):
                     if trade_id['id'] not in self.all_processed_trades:
                         self.all_processed_trades.append(trade_id['id'])
-                        async with aiohttp.ClientSession() as session:
+                        async with sessions.shared() as session:
                             async with session.get(f"https://trades.roblox.com/v1/trades/{trade_id['id']}", cookies={".ROBLOSECURITY": self.cookie}) as resp:
                                 if resp.status == 200:
                                     json_data = await resp.json()
+                                    if scrape_type == "completed":
+                                        # Their inventory changed with the trade.
+                                        for offer in json_data.get("offers", []):
+                                            if offer["user"]["id"] != self.user_id:
+                                                self.inventories.invalidate(offer["user"]["id"])
                                     await self.send_webhook_notification(await generate_trade_content(self, json_data))
 
                 if scrape_type == "completed":
@@ -327,7 +350,7 @@ async def trades_watcher(self):
             await asyncio.sleep(20)
 
 async def scrape_trades_completed_inactive(self, scrape_type):
-    async with aiohttp.ClientSession() as session:
+    async with sessions.shared() as session:
         try:
             async with session.get(f"https://trades.roblox.com/v1/trades/{scrape_type}?cursor=&limit=10&sortOrder=Desc", cookies={".ROBLOSECURITY": self.cookie}) as response:
                 if response.status in [401, 403] and getattr(self, 'roblox_cookie_working', True):
@@ -346,7 +369,67 @@ async def scrape_trades_completed_inactive(self, scrape_type):
             logging.error(f"Exception while scraping {scrape_type} trades: {e}")
             return {}, 0
 
-async def generate_trade(self, user_id, counter=False):
+async def tradable_items(self, user_id):
+    """
+    Both sides of a possible trade with user_id: our and their inventory entries not on hold,
+    the catalog rows of the ones rules.Eligibility lets each side trade, and the index of our
+    combinations from sync_giver_index().
+    """
+    ours = await our_side(self)
+    theirs = await partner_side(self, user_id) if ours else None
+    if not ours or not theirs:
+        logging.warning(f"⚠️ No items available for trade with user {user_id}.")
+        return None
+    giver_items, giver_limiteds_rolimon, giver_index = ours
+    receiver_items, receiver_limiteds_rolimon = theirs
+    return giver_items, giver_limiteds_rolimon, receiver_items, receiver_limiteds_rolimon, giver_index
+
+
+async def our_side(self):
+    """Our inventory entries not on hold, the catalog rows we may give and the synced giver index, or None."""
+    giver_items_dict = self.limiteds.copy()
+    if not giver_items_dict:
+        return None
+    giver_items = [item for sublist in giver_items_dict.values() for item in sublist if not item["isOnHold"]]
+
+    eligibility = self.eligibility()
+    giver_entries = [(str(item["assetId"]), eligibility.tradable(item["assetId"], rules.GIVING)) for item in giver_items]
+    giver_entries = [(item_id, row) for item_id, row in giver_entries if row is not None]
+    giver_limiteds_rolimon = [row for _, row in giver_entries]
+    giver_index = await sync_giver_index(self, giver_entries)
+    return giver_items, giver_limiteds_rolimon, giver_index
+
+
+async def partner_side(self, user_id):
+    """user_id's inventory entries not on hold and the catalog rows we may receive, or None."""
+    receiver_items_dict = await self.inventories.get(self.cookie, user_id)
+    if not receiver_items_dict:
+        return None
+    receiver_items = [item for sublist in receiver_items_dict.values() for item in sublist if not item["isOnHold"]]
+
+    eligibility = self.eligibility()
+    receiver_limiteds_rolimon = [eligibility.tradable(item["assetId"], rules.RECEIVING) for item in receiver_items]
+    receiver_limiteds_rolimon = [row for row in receiver_limiteds_rolimon if row is not None]
+    return receiver_items, receiver_limiteds_rolimon
+
+
+async def sync_giver_index(self, giver_entries):
+    """
+    self.giver_index brought in line with our (item id, catalog row) entries, or None when we hold
+    too many items to index, in which case searches enumerate our combinations themselves. The
+    sync runs in a worker thread on a copy that replaces the index once done.
+    """
+    limit = self.algorithm["performance"].get("window_index_limit", algorithm.WINDOW_INDEX_LIMIT)
+    if not algorithm.window_fits(len(giver_entries), self.giver_index.max_size, limit):
+        if len(self.giver_index):
+            self.giver_index = combos.CombinationIndex(self.giver_index.max_size)
+        return None
+    self.giver_index = await asyncio.to_thread(self.giver_index.synced, giver_entries, self.score_table())
+    return self.giver_index
+
+
+async def wait_while_on_hold(self):
+    """Holds off trade searches while the only item we have is on hold, with a webhook when pausing and resuming."""
     all_my_items_raw = [item for sublist in self.limiteds.values() for item in sublist]
 
     if len(all_my_items_raw) == 1 and all_my_items_raw[0].get("isOnHold", False):
@@ -369,58 +452,119 @@ async def generate_trade(self, user_id, counter=False):
             resume_embed = await generate_holding_period_embed("resumed")
             await self.send_webhook_notification(resume_embed)
 
-    receiver_items_dict = await user.scrape_collectibles(self.cookie, user_id)
-    giver_items_dict = self.limiteds.copy()
-    if not receiver_items_dict or not giver_items_dict:
-        logging.warning(f"⚠️ No items available for trade with user {user_id}.")
+
+async def generate_trade(self, user_id, counter=False):
+    await wait_while_on_hold(self)
+    sides = await tradable_items(self, user_id)
+    if not sides:
         return None
+    giver_items, giver_limiteds_rolimon, receiver_items, receiver_limiteds_rolimon, giver_index = sides
+    score_table = self.score_table()
 
-    receiver_items = [item for sublist in receiver_items_dict.values() for item in sublist if not item["isOnHold"]]
-    giver_items = [item for sublist in giver_items_dict.values() for item in sublist if not item["isOnHold"]]
+    mode = random.choice(self.algorithm["modes"]["trade_methods"])
+    giver_min, giver_max, receiver_min, receiver_max = algorithm.size_ranges(self.algorithm, mode)
 
-    giver_limiteds_rolimon = [
-        self.all_limiteds[str(item["assetId"])]
-        for item in giver_items
-        if str(item["assetId"]) in self.all_limiteds
-        and self.all_limiteds[str(item["assetId"])][7]
-        and not (self.algorithm["modes"]["value_only"] and self.all_limiteds[str(item["assetId"])][3] == 1)
-        and int(item["assetId"]) not in self.item_ids_not_for_trade
-    ]
+    min_trade_send_value_total = self.algorithm["thresholds"]["min_trade_send_value_total"] if not counter else 0
+    key = search_key(self, mode, min_trade_send_value_total, giver_limiteds_rolimon, receiver_limiteds_rolimon)
+    cached = self.search_cache.get(key, cache.MISSING)
+    if cached is not cache.MISSING:
+        logging.info(f"♻️ Nothing changed since the last trade search with user {user_id}, reusing its result.")
+        return search_result(self, user_id, cached, {}, giver_items, receiver_items)
 
-    receiver_limiteds_rolimon_filtered = [
-        self.all_limiteds[str(item["assetId"])]
-        for item in receiver_items
-        if str(item["assetId"]) in self.all_limiteds
-        and self.all_limiteds[str(item["assetId"])][7] != 1
-        and not (self.algorithm["modes"]["value_only"] and self.all_limiteds[str(item["assetId"])][3] == 1)
-        and int(item["assetId"]) not in self.item_ids_not_accepting
-    ]
-    
-    receiver_limiteds_rolimon = []
-    for item_data in receiver_limiteds_rolimon_filtered:
-        item_name = item_data[0]
-        item_value = item_data[3] if item_data[3] != -1 else item_data[2]
-
-        if "egg" in item_name.lower() and item_value < 680:
-            logging.info(f"🥚 Applying egg rule to '{item_name}' (value: {item_value}) in trade generation. Treating as 0 Robux.")
-            modified_item_data = list(item_data)
-            modified_item_data[2] = 0
-            modified_item_data[3] = 0
-            receiver_limiteds_rolimon.append(modified_item_data)
+    search_stats = {}
+    best_trade_info = await algorithm.find_best_trade(
+        giver_items=giver_limiteds_rolimon,
+        receiver_items=receiver_limiteds_rolimon,
+        settings=self.algorithm,
+        giver_max=giver_max, giver_min=giver_min,
+        receiver_min=receiver_min, receiver_max=receiver_max,
+        allow_edge=True,
+        batch_size=self.algorithm["performance"]["batch_size"],
+        max_pairs=self.algorithm["performance"]["max_pairs"],
+        mode=mode,
+        min_trade_send_value_total=min_trade_send_value_total,
+        score_table=score_table,
+        giver_index=giver_index,
+        time_budget=self.algorithm["performance"].get("time_budget"),
+        stats=search_stats,
+        alternatives=self.algorithm["performance"].get("alternatives", 1)
+    )
+    if not search_stats.get("timed_out"):
+        self.search_cache.put(key, best_trade_info)
+    return search_result(self, user_id, best_trade_info, search_stats, giver_items, receiver_items)
+
+
+def search_key(self, mode, min_trade_send_value_total, giver_rows, receiver_rows):
+    """
+    Cache key of a trade search: both sides' items, the catalog version and the settings. Searches
+    cut short by the time budget are not cached, so the same key always gives the same trade.
+    """
+    return (
+        algorithm.items_fingerprint(receiver_rows), algorithm.items_fingerprint(giver_rows),
+        self.catalog_version, algorithm.settings_key(self.algorithm), mode, min_trade_send_value_total
+    )
+
+
+async def generate_trades(self, user_ids):
+    """
+    generate_trade for several users at once, e.g. a burst of new trade ads. One batched
+    algorithm.find_best_trades search covers all of them. Returns {user_id: trade data} for the
+    users a trade was found with.
+    """
+    await wait_while_on_hold(self)
+
+    # Our side is the same for every partner, so it is put together and synced once per batch.
+    ours = await our_side(self)
+    if not ours:
+        logging.warning("⚠️ No items of ours available for trade.")
+        return {}
+    giver_items, giver_limiteds_rolimon, giver_index = ours
+
+    partners = {}
+    for user_id in user_ids:
+        theirs = await partner_side(self, user_id)
+        if theirs:
+            partners[user_id] = theirs
         else:
-            receiver_limiteds_rolimon.append(item_data)
+            logging.warning(f"⚠️ No items available for trade with user {user_id}.")
+    if not partners:
+        return {}
 
     mode = random.choice(self.algorithm["modes"]["trade_methods"])
-    if mode == "upgrade":
-        receiver_min, receiver_max = self.algorithm["downgrade"]["min_items"], self.algorithm["downgrade"]["max_items"]
-        giver_min, giver_max = self.algorithm["upgrade"]["min_items"], self.algorithm["upgrade"]["max_items"]
-    else:
-        receiver_min, receiver_max = self.algorithm["upgrade"]["min_items"], self.algorithm["upgrade"]["max_items"]
-        giver_min, giver_max = self.algorithm["downgrade"]["min_items"], self.algorithm["downgrade"]["max_items"]
-
-    best_trade_info = await algorithm.find_best_trade(
+    min_trade_send_value_total = self.algorithm["thresholds"]["min_trade_send_value_total"]
+    keys = {
+        user_id: search_key(self, mode, min_trade_send_value_total, giver_limiteds_rolimon, sides[1])
+        for user_id, sides in partners.items()
+    }
+    best_trades, search_stats = {}, {}
+    for user_id, key in keys.items():
+        cached = self.search_cache.get(key, cache.MISSING)
+        if cached is not cache.MISSING:
+            logging.info(f"♻️ Nothing changed since the last trade search with user {user_id}, reusing its result.")
+            best_trades[user_id], search_stats[user_id] = cached, {}
+
+    searching = {user_id: sides[1] for user_id, sides in partners.items() if user_id not in best_trades}
+    if searching:
+        logging.info(f"🔄 Searching trades with {len(searching)} users at once.")
+        best_trades.update(await search_partners(self, mode, giver_limiteds_rolimon, giver_index, searching, min_trade_send_value_total, search_stats))
+        for user_id in searching:
+            if not search_stats[user_id].get("timed_out"):
+                self.search_cache.put(keys[user_id], best_trades[user_id])
+
+    offers = {}
+    for user_id, best_trade_info in best_trades.items():
+        offer = search_result(self, user_id, best_trade_info, search_stats[user_id], giver_items, partners[user_id][0])
+        if offer:
+            offers[user_id] = offer
+    return offers
+
+
+async def search_partners(self, mode, giver_limiteds_rolimon, giver_index, partners, min_trade_send_value_total, search_stats):
+    """find_best_trades with the bot's settings, `partners` maps user ids to their catalog rows."""
+    giver_min, giver_max, receiver_min, receiver_max = algorithm.size_ranges(self.algorithm, mode)
+    return await algorithm.find_best_trades(
         giver_items=giver_limiteds_rolimon,
-        receiver_items=receiver_limiteds_rolimon,
+        partners=partners,
         settings=self.algorithm,
         giver_max=giver_max, giver_min=giver_min,
         receiver_min=receiver_min, receiver_max=receiver_max,
@@ -428,74 +572,163 @@ async def generate_trade(self, user_id, counter=False):
         batch_size=self.algorithm["performance"]["batch_size"],
         max_pairs=self.algorithm["performance"]["max_pairs"],
         mode=mode,
-        min_trade_send_value_total=self.algorithm["thresholds"]["min_trade_send_value_total"] if not counter else 0
+        min_trade_send_value_total=min_trade_send_value_total,
+        score_table=self.score_table(),
+        giver_index=giver_index,
+        time_budget=self.algorithm["performance"].get("time_budget"),
+        stats=search_stats,
+        alternatives=self.algorithm["performance"].get("alternatives", 1)
     )
 
+
+def search_result(self, user_id, best_trade_info, search_stats, giver_items, receiver_items):
+    """Logs how the search with user_id went and turns its best trade into trade data."""
+    if search_stats.get("pruned_givers") or search_stats.get("pruned_receivers"):
+        logging.info(f"✂️ Skipped {search_stats['pruned_givers']} of our items and {search_stats['pruned_receivers']} of user {user_id}'s items that could not improve the trade.")
+    coverage = f"{search_stats['coverage']:.0%}" if search_stats.get("coverage") is not None else "part"
+    if search_stats.get("timed_out"):
+        logging.info(f"⏱️ Trade search for user {user_id} hit its time budget after {search_stats['evaluated']} candidates ({coverage} of the search space covered).")
+    elif search_stats.get("truncated"):
+        logging.info(f"📏 Trade search for user {user_id} stopped at max_pairs after {search_stats['evaluated']} candidates ({coverage} of the search space covered).")
+
     if best_trade_info:
         logging.info(f"✅ Best trade found for user {user_id}. Preparing trade data.")
-        best_trade = best_trade_info['trade']
-        
-        giving_uaids_map = defaultdict(list)
-        for item in giver_items:
-            giving_uaids_map[item['name']].append(item)
-            
-        receiving_uaids_map = defaultdict(list)
-        for item in receiver_items:
-            receiving_uaids_map[item['name']].append(item)
-
-        giving_item_uaids, giving_items_raw_list = [], []
-        for item in best_trade["giving_items"]:
-            item_name = item[0]
-            if giving_uaids_map[item_name]:
-                raw_item = giving_uaids_map[item_name].pop(0)
-                giving_item_uaids.append(raw_item['userAssetId'])
-                giving_items_raw_list.append(raw_item)
-                
-        receiving_item_uaids, receiving_items_raw_list = [], []
-        for item in best_trade["receiving_items"]:
-            item_name = item[0]
-            if receiving_uaids_map[item_name]:
-                raw_item = receiving_uaids_map[item_name].pop(0)
-                receiving_item_uaids.append(raw_item['userAssetId'])
-                receiving_items_raw_list.append(raw_item)
-
-        if not receiving_item_uaids or not giving_item_uaids:
-            return None
-
-        data_json = {
-            "offers": [
-                {"userId": self.user_id, "userAssetIds": giving_item_uaids, "robux": 0},
-                {"userId": user_id, "userAssetIds": receiving_item_uaids, "robux": 0}
-            ]
-        }
-        return {
-            'trade_data': data_json,
-            'giving_items_raw': giving_items_raw_list,
-            'receiving_items_raw': receiving_items_raw_list,
-            'giving_score': best_trade_info['giving_score'],
-            'receiving_score': best_trade_info['receiving_score']
-        }
+        return trade_offers(self, user_id, best_trade_info, giver_items, receiver_items)
     else:
         logging.info(f"📉 No profitable trade found for user {user_id} that matches current settings.")
         return None
 
 
-async def send_trade(self, user_id):
+async def generate_counter(self, user_id, giving_items, receiving_items):
+    """
+    Counter-offer for a trade user_id sent us, giving_items and receiving_items being its catalog
+    rows. Trades a few item changes away from it are tried first, they stay close to what the
+    partner asked for and take a fraction of a full search. generate_trade runs only if none of
+    them is acceptable.
+    """
+    sides = await tradable_items(self, user_id)
+    if sides:
+        giver_items, giver_limiteds_rolimon, receiver_items, receiver_limiteds_rolimon, _ = sides
+        performance = self.algorithm["performance"]
+        counter_info = await algorithm.local_counter(
+            giving_items, receiving_items, giver_limiteds_rolimon, receiver_limiteds_rolimon, self.algorithm,
+            allow_edge=True, score_table=self.score_table(),
+            rounds=performance.get("counter_rounds", 3), beam=performance.get("counter_beam", 8),
+            alternatives=performance.get("alternatives", 1)
+        )
+        if counter_info:
+            logging.info(f"✅ Found a counter-offer for user {user_id} close to their trade. Preparing trade data.")
+            offer = trade_offers(self, user_id, counter_info, giver_items, receiver_items)
+            if offer:
+                return offer
+    logging.info(f"🔄 No counter-offer close to user {user_id}'s trade, searching all trades.")
+    return await generate_trade(self, user_id, True)
+
+
+def trade_offers(self, user_id, trade_info, giver_items, receiver_items):
+    """trade_offer of a find_best_trade result, with its alternatives as trade data under 'alternatives'."""
+    offer = trade_offer(self, user_id, trade_info, giver_items, receiver_items)
+    if not offer:
+        return None
+    offer['alternatives'] = [
+        alternative for alternative in (
+            trade_offer(self, user_id, info, giver_items, receiver_items)
+            for info in trade_info.get('alternatives', [])
+        ) if alternative
+    ]
+    if offer['alternatives']:
+        logging.info(f"📋 Found {len(offer['alternatives'])} alternative trade(s) for user {user_id} to fall back on.")
+    return offer
+
+
+def trade_offer(self, user_id, trade_info, giver_items, receiver_items):
+    """Turns a find_best_trade result into trade data, picking a UAID for every item."""
+    best_trade = trade_info['trade']
+
+    giving_uaids_map = defaultdict(list)
+    for item in giver_items:
+        giving_uaids_map[item['name']].append(item)
+
+    receiving_uaids_map = defaultdict(list)
+    for item in receiver_items:
+        receiving_uaids_map[item['name']].append(item)
+
+    giving_item_uaids, giving_items_raw_list = [], []
+    for item in best_trade["giving_items"]:
+        item_name = item[0]
+        if giving_uaids_map[item_name]:
+            raw_item = giving_uaids_map[item_name].pop(0)
+            giving_item_uaids.append(raw_item['userAssetId'])
+            giving_items_raw_list.append(raw_item)
+
+    receiving_item_uaids, receiving_items_raw_list = [], []
+    for item in best_trade["receiving_items"]:
+        item_name = item[0]
+        if receiving_uaids_map[item_name]:
+            raw_item = receiving_uaids_map[item_name].pop(0)
+            receiving_item_uaids.append(raw_item['userAssetId'])
+            receiving_items_raw_list.append(raw_item)
+
+    if not receiving_item_uaids or not giving_item_uaids:
+        return None
+
+    data_json = {
+        "offers": [
+            {"userId": self.user_id, "userAssetIds": giving_item_uaids, "robux": 0},
+            {"userId": user_id, "userAssetIds": receiving_item_uaids, "robux": 0}
+        ]
+    }
+    return {
+        'trade_data': data_json,
+        'giving_items_raw': giving_items_raw_list,
+        'receiving_items_raw': receiving_items_raw_list,
+        'giving_score': trade_info['giving_score'],
+        'receiving_score': trade_info['receiving_score']
+    }
+
+
+def can_send_trade(self):
     now = time.time()
     self.trade_timestamps = [ts for ts in self.trade_timestamps if now - ts < self.TRADE_LIMIT_WINDOW]
 
     if now < self.rate_limit_until:
         logging.warning(f"🕒 Rate limited. Cannot send trade. Next attempt possible in {int((self.rate_limit_until - now)/60)} minutes.")
-        return
+        return False
 
     if len(self.trade_timestamps) >= self.TRADE_LIMIT_COUNT:
         self.rate_limit_until = self.trade_timestamps[0] + self.TRADE_LIMIT_WINDOW
         logging.warning(f"🕒 Daily trade limit of {self.TRADE_LIMIT_COUNT} reached. Cannot send trade.")
+        return False
+    return True
+
+
+async def send_trade(self, user_id):
+    if not can_send_trade(self):
         return
 
     logging.info(f"🔄 Generating possible trades with user {user_id}")
     trade_info_dict = await generate_trade(self, user_id, False)
     if trade_info_dict:
+        await send_offer(self, user_id, trade_info_dict)
+
+
+async def send_trades(self, user_ids):
+    """send_trade for several users, with the trades for all of them found in one batched search."""
+    if not can_send_trade(self):
+        return
+
+    offers = await generate_trades(self, user_ids)
+    for user_id, trade_info_dict in offers.items():
+        if not can_send_trade(self):
+            return
+        await send_offer(self, user_id, trade_info_dict)
+
+
+async def send_offer(self, user_id, trade_info_dict):
+    # Offers go out no faster than one per trade sleep_time, however they were found.
+    await self.trade_sends.acquire()
+    # Alternatives share no items with the best trade, so when Roblox refuses one the next can still go out.
+    for trade_info_dict in [trade_info_dict] + trade_info_dict['alternatives']:
         trade_data = trade_info_dict['trade_data']
         logging.info(f"✉️ Sending trade to user {user_id}.")
         response = await self.authenticator_client.send_trade(TAG=self.cookie[-10:], TRADE_DATA=trade_data)
@@ -505,7 +738,7 @@ async def send_trade(self, user_id):
             trade_id = (await response.json())['id']
             logging.info(f"✅ Trade sent successfully. Trade ID: {trade_id}")
             
-            async with aiohttp.ClientSession() as session:
+            async with sessions.shared() as session:
                 async with session.get(f"https://users.roblox.com/v1/users/{user_id}") as user_resp:
                     partner_info = {'id': user_id, 'name': 'N/A'}
                     if user_resp.status == 200:
@@ -519,6 +752,7 @@ async def send_trade(self, user_id):
                 trade_info_dict['giving_score'], trade_info_dict['receiving_score'], reason
             )
             await self.send_webhook_notification(webhook_payload)
+            return
 
         elif response.status == 429:
             logging.error("❌ Failed to send trade: Rate limited by Roblox (429).")
@@ -538,6 +772,7 @@ async def send_trade(self, user_id):
             
             rate_limit_embed = await generate_rate_limit_embed(self.rate_limit_until)
             await self.send_webhook_notification(rate_limit_embed)
+            return
         else:
             logging.error(f"❌ Failed to send trade to user {user_id}. Response status: {response.status}. Response json {str(await response.json())}")
             await self.send_webhook_notification({"content": f"Failed to send trade to user: {str(user_id)}. Response status: {response.status} . Response json {str(await response.json())}"})
@@ -1,14 +1,23 @@
-import aiohttp
 from collections import defaultdict
 
-async def scrape_collectibles(cookie, user_id):
+from . import cache
+from . import sessions
+
+# Seconds a partner's inventory is reused, and how long a private one is taken to stay private.
+INVENTORY_TTL = 300
+PRIVATE_INVENTORY_TTL = 3600
+
+async def fetch_collectibles(cookie, user_id):
+    """Pages through user_id's collectibles, returns them by asset id with the status of the last page request."""
     next_page_cursor = ""
     items = defaultdict(list)
+    status = 0
 
-    async with aiohttp.ClientSession() as session:
+    async with sessions.shared() as session:
         while True:
             url = f"https://inventory.roblox.com/v1/users/{user_id}/assets/collectibles?limit=100&cursor={next_page_cursor}"
             async with session.get(url, cookies={".ROBLOSECURITY": cookie}) as response:
+                status = response.status
                 if response.status != 200:
                     break
 
@@ -21,4 +30,41 @@ async def scrape_collectibles(cookie, user_id):
 
                 next_page_cursor = json_response["nextPageCursor"]
 
-    return dict(items)
\ No newline at end of file
+    return dict(items), status
+
+async def scrape_collectibles(cookie, user_id):
+    items, _ = await fetch_collectibles(cookie, user_id)
+    return items
+
+class InventoryCache:
+    """
+    Partner inventories kept for `ttl` seconds, so a partner met through an ad, a counter-offer
+    and another ad within minutes is scraped once. Concurrent lookups for the same user share one
+    fetch, and private inventories (403) are remembered as empty for `private_ttl` seconds.
+    Only complete inventories are kept; failed or cut-short scrapes are tried again next time.
+    """
+    def __init__(self, ttl=INVENTORY_TTL, private_ttl=PRIVATE_INVENTORY_TTL, max_size=1024):
+        self.inventories = cache.LRUCache(max_size, ttl)
+        self.private = cache.LRUCache(max_size, private_ttl)
+        self._flights = cache.SingleFlight()
+
+    async def get(self, cookie, user_id):
+        if user_id in self.private:
+            return {}
+        items = self.inventories.get(user_id, cache.MISSING)
+        if items is not cache.MISSING:
+            return items
+        return await self._flights.run(user_id, lambda: self._fetch(cookie, user_id))
+
+    async def _fetch(self, cookie, user_id):
+        items, status = await fetch_collectibles(cookie, user_id)
+        if status == 200:
+            self.inventories.put(user_id, items)
+        elif status == 403:
+            self.private.put(user_id, status)
+        return items
+
+    def invalidate(self, user_id):
+        """Forgets user_id's inventory, for when a trade with them went through."""
+        self.inventories.pop(user_id)
+        self.private.pop(user_id)
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Deque, NamedTuple, Optional
+
+# Longest stretch, in seconds, CPU-heavy loops keep the event loop before letting other tasks run.
+TIME_SLICE = 0.05
+
+
+class TimeSlice:
+    """
+    Cooperative time-slicing for long loops running on the event loop: awaiting pause() hands
+    control to other tasks once `seconds` have passed since it last did, and is free otherwise.
+    """
+    def __init__(self, seconds: float = TIME_SLICE) -> None:
+        self.seconds = seconds
+        self._since = time.monotonic()
+
+    async def pause(self) -> None:
+        if time.monotonic() - self._since >= self.seconds:
+            await asyncio.sleep(0)
+            self._since = time.monotonic()
+
+
+class Stall(NamedTuple):
+    started: float
+    seconds: float
+    task: str
+    stack: str
+
+
+class LoopWatchdog:
+    """
+    Watches an event loop from a background thread. A heartbeat task on the loop checks in every
+    `interval` seconds; once it is more than `max_lag` seconds late, something is holding the loop,
+    and the stack of the loop's thread is logged along with the task that was running. Finished
+    stalls are kept in `stalls`, and `worst` is the longest one seen.
+    """
+    def __init__(self, max_lag: float = 1.0, interval: Optional[float] = None, history: int = 20) -> None:
+        self.max_lag = max_lag
+        self.interval = interval or max_lag / 4
+        self.stalls: Deque[Stall] = deque(maxlen=history)
+        self.worst = 0.0
+        self._beat = time.monotonic()
+        self._stop = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Starts watching the running loop, call it from a coroutine on that loop."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._heartbeat = self._loop.create_task(self._pulse())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logging.info(f"🐕 Event loop watchdog started, reporting stalls over {self.max_lag}s.")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+
+    async def _pulse(self) -> None:
+        while True:
+            self._beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def _running_task(self) -> str:
+        try:
+            task = asyncio.current_task(self._loop)
+        except RuntimeError:
+            task = None
+        if task is None:
+            return "no task (a plain callback)"
+        coro = task.get_coro()
+        return f"{task.get_name()} ({getattr(coro, '__qualname__', coro)})"
+
+    def _watch(self) -> None:
+        stalled_beat, task, stack = None, "", ""
+        while not self._stop.wait(self.interval):
+            beat = self._beat
+            if stalled_beat is not None and beat != stalled_beat:
+                seconds = beat - stalled_beat - self.interval
+                self.stalls.append(Stall(stalled_beat + self.interval, seconds, task, stack))
+                self.worst = max(self.worst, seconds)
+                logging.warning(f"🐢 Event loop was blocked for {seconds:.2f}s by {task}.")
+                stalled_beat = None
+
+            lag = time.monotonic() - beat - self.interval
+            if stalled_beat is None and lag > self.max_lag:
+                stalled_beat = beat
+                task = self._running_task()
+                frame = sys._current_frames().get(self._loop_thread)
+                stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+                logging.warning(f"🐢 Event loop blocked for {lag:.2f}s so far, running {task}:\n{stack}")